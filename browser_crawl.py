@@ -0,0 +1,281 @@
+import os
+import time
+import json
+import logging
+import functools
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import NoSuchElementException
+
+from fund_index import fund_id_for
+from pdf_download import pdf_url_from_viewer_src
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FILE = "download_progress.json"
+
+# Listing pages for each document type
+LISTING_URLS = {
+    "KIM": "https://www.sebi.gov.in/sebiweb/other/OtherAction.do?doMutualFund=yes&mftype=3",
+    "SID": "https://www.sebi.gov.in/sebiweb/other/OtherAction.do?doMutualFund=yes&mftype=2",
+}
+
+
+class RecycleDriver(Exception):
+    """Raised inside a crawl pass when the browser should be restarted."""
+
+
+# Progress tracker functions
+def save_progress(doc_type, category_index, fund_index, progress_file=PROGRESS_FILE):
+    """Save current progress to a file."""
+    progress = {
+        "doc_type": doc_type,
+        "category_index": category_index,
+        "fund_index": fund_index
+    }
+    with open(progress_file, "w") as f:
+        json.dump(progress, f)
+    logger.info(f"Progress saved: {doc_type}, category {category_index}, fund {fund_index}")
+
+def load_progress(progress_file=PROGRESS_FILE):
+    """Load progress from file."""
+    try:
+        with open(progress_file, "r") as f:
+            progress = json.load(f)
+        logger.info(f"Resuming from: {progress.get('doc_type')}, category {progress['category_index']}, fund {progress['fund_index']}")
+        return progress.get("doc_type"), progress["category_index"], progress["fund_index"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        logger.info("No progress file found or invalid format. Starting from beginning.")
+        return None, 0, 0
+
+def clear_progress(progress_file=PROGRESS_FILE):
+    """Remove the progress file once a crawl has finished."""
+    if os.path.exists(progress_file):
+        os.remove(progress_file)
+        logger.info("Progress file cleared.")
+
+def note_crawl_error(index):
+    """Count a category or fund the crawl could not get through.
+
+    The count lives in the index so it survives restarts; a crawl with any
+    errors may have missed funds that are still listed, so it must not be
+    used to decide which funds were withdrawn.
+    """
+    index.meta["crawl_errors"] = index.meta.get("crawl_errors", 0) + 1
+
+def note_fund_listed(index, doc_type):
+    """Count a fund the crawl found listed under doc_type.
+
+    A doc type whose listing yielded no funds was most likely not read at all,
+    so nothing of that type is retired at the end of the crawl.
+    """
+    listed = index.meta.setdefault("crawl_listed", {})
+    listed[doc_type] = listed.get(doc_type, 0) + 1
+
+def iter_js_links(driver, function_name, start=0):
+    """Yield (index, link) for table links calling function_name, looking each one up on demand.
+
+    Links are fetched one at a time by position instead of materialising the whole
+    list of WebElements, so memory stays flat however long the listing is and
+    resuming at ``start`` does not touch the links before it.
+    """
+    xpath = f"//table//a[contains(@onclick, '{function_name}') or contains(@href, 'javascript:{function_name}')]"
+    if not driver.find_elements(By.XPATH, f"({xpath})[1]"):
+        # Fall back to any JavaScript link in the table
+        xpath = "//table//a[starts-with(@href, 'javascript:') or @onclick]"
+        logger.info(f"No {function_name} links found, falling back to all JavaScript links")
+
+    index = start
+    while True:
+        matches = driver.find_elements(By.XPATH, f"({xpath})[{index + 1}]")
+        if not matches:
+            return
+        yield index, matches[0]
+        index += 1
+
+def close_extra_tabs(driver, keep):
+    """Close tabs until only `keep` remain and focus the last one."""
+    while len(driver.window_handles) > keep:
+        driver.switch_to.window(driver.window_handles[-1])
+        driver.close()
+    driver.switch_to.window(driver.window_handles[-1])
+
+def find_iframe_pdf_url(driver):
+    """Return the PDF URL embedded in the details page viewer iframe, or None."""
+    try:
+        iframe = driver.find_element(By.XPATH, "//iframe[contains(@src, '.pdf')]")
+    except NoSuchElementException:
+        return None
+    return pdf_url_from_viewer_src(iframe.get_attribute("src"))
+
+def drain_performance_log(driver):
+    """Return and clear the browser's buffered performance log entries."""
+    try:
+        return driver.get_log("performance")
+    except Exception:
+        return []
+
+def capture_pdf_url(driver, timeout=10):
+    """Watch the browser's network events for a PDF response and return its URL, or None.
+
+    Chrome is told not to save downloads, so the click only reveals where the
+    PDF lives; the file itself is fetched by download_pdf().
+    """
+    deadline = time.monotonic() + timeout
+    candidate = None
+    while time.monotonic() < deadline:
+        for entry in drain_performance_log(driver):
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            params = message.get("params", {})
+            if message.get("method") == "Network.responseReceived":
+                response = params.get("response", {})
+                if "pdf" in response.get("mimeType", "").lower():
+                    return response.get("url")
+            elif message.get("method") == "Network.requestWillBeSent":
+                url = params.get("request", {}).get("url", "")
+                if url.split("?")[0].lower().endswith(".pdf"):
+                    candidate = url
+        if candidate:
+            return candidate
+        time.sleep(0.5)
+    return None
+
+def process_fund(driver, index, downloads, fund_link, doc_type, fund_number, download_dir):
+    """Open one fund's details page and queue its PDF for download."""
+    fund_name = fund_link.text.strip()
+    onclick = fund_link.get_attribute("onclick")
+    href = fund_link.get_attribute("href")
+    logger.info(f"Processing fund {fund_number}: {fund_name}")
+
+    # Click on the fund link
+    fund_link.click()
+    time.sleep(3)
+
+    # Switch to the new tab if opened
+    if len(driver.window_handles) > 2:
+        driver.switch_to.window(driver.window_handles[-1])
+
+    # Wait for fund details page to load
+    time.sleep(3)
+
+    # Identify the fund by the site's own ids rather than its display name
+    pdf_url = find_iframe_pdf_url(driver)
+    fund_id = fund_id_for(onclick=onclick, href=href, pdf_url=pdf_url, fund_name=fund_name)
+    index.register_fund(fund_id, fund_name, doc_type=doc_type, detail_url=driver.current_url)
+    note_fund_listed(index, doc_type)
+    filename = index.document_filename(fund_id, doc_type)
+
+    try:
+        if index.has_document(fund_id, doc_type):
+            logger.info(f"Already downloaded: {filename} - skipping download")
+            return
+
+        # Look for the download button
+        try:
+            download_button = driver.find_element(By.CSS_SELECTOR, "#secondaryDownload")
+            logger.info(f"Found download button for {fund_name}")
+
+            # Click the download button and catch the PDF request it makes
+            drain_performance_log(driver)
+            download_button.click()
+            pdf_url = capture_pdf_url(driver)
+            if not pdf_url:
+                logger.warning(f"Could not capture the PDF URL behind the download button for {fund_name}")
+                return
+            logger.info(f"Download button for {fund_name} points to {pdf_url}")
+        except NoSuchElementException:
+            logger.info(f"No download button found for {fund_name}")
+
+            # Try alternative methods - download the PDF shown in the iframe
+            if not pdf_url:
+                logger.warning(f"No iframe found for {fund_name}")
+                return
+            logger.info(f"Downloading PDF from iframe: {pdf_url}")
+
+        downloads.submit(pdf_url, filename, download_dir, fund_id=fund_id, doc_type=doc_type,
+                         on_success=functools.partial(index.record_download, fund_id, doc_type))
+    finally:
+        drain_performance_log(driver)
+        index.save()
+
+def _crawl_pass(session, index, downloads, doc_type, download_dir, progress_file):
+    """Crawl one document type from the saved position until done or the browser needs recycling."""
+    last_doc_type, last_category_index, last_fund_index = load_progress(progress_file)
+    if last_doc_type not in (None, doc_type):
+        last_category_index, last_fund_index = 0, 0
+
+    driver = session.driver
+    listing_url = LISTING_URLS[doc_type]
+    logger.info(f"Navigating to {doc_type} page: {listing_url}")
+    driver.get(listing_url)
+
+    # Wait for page to load
+    WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "table")))
+    logger.info(f"{doc_type} page loaded successfully.")
+
+    # Process each category link, starting from the saved position
+    for i, js_link in iter_js_links(driver, "getmutuakFund", start=last_category_index):
+        category_name = ""
+        try:
+            category_name = js_link.text.strip()
+            logger.info(f"Processing category {i+1}: {category_name}")
+
+            # Click on the JavaScript link
+            js_link.click()
+            time.sleep(3)
+
+            # Switch to the new tab if opened
+            if len(driver.window_handles) > 1:
+                driver.switch_to.window(driver.window_handles[-1])
+
+            # Wait for fund list page to load
+            WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "table")))
+            logger.info("Fund list page loaded.")
+
+            start_fund = last_fund_index if i == last_category_index else 0
+            if start_fund:
+                logger.info(f"Resuming category {i+1} at fund {start_fund+1}")
+
+            # Process each fund link
+            for j, fund_link in iter_js_links(driver, "getfundDetails", start=start_fund):
+                # Save current progress
+                save_progress(doc_type, i, j, progress_file)
+
+                try:
+                    process_fund(driver, index, downloads, fund_link, doc_type, j + 1, download_dir)
+                except Exception as e:
+                    logger.error(f"Error processing fund {j+1} in {category_name}: {str(e)}")
+                    note_crawl_error(index)
+
+                # Close fund details tab and switch back to fund list tab
+                if len(driver.window_handles) > 2:
+                    close_extra_tabs(driver, 2)
+
+                if session.note_fund_processed():
+                    save_progress(doc_type, i, j + 1, progress_file)
+                    raise RecycleDriver()
+
+            # Close fund list tab and switch back to main tab
+            close_extra_tabs(driver, 1)
+            save_progress(doc_type, i + 1, 0, progress_file)
+        except RecycleDriver:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing category {category_name}: {str(e)}")
+            note_crawl_error(index)
+            # Make sure we're back on the main tab
+            close_extra_tabs(driver, 1)
+
+def crawl_document_type(session, index, downloads, doc_type, download_dir, progress_file=PROGRESS_FILE):
+    """Crawl every fund of one document type, restarting the browser whenever it asks to be recycled."""
+    logger.info(f"\n--- Processing {doc_type} documents ---")
+    while True:
+        try:
+            _crawl_pass(session, index, downloads, doc_type, download_dir, progress_file)
+            return
+        except RecycleDriver:
+            session.restart()
@@ -0,0 +1,109 @@
+import os
+import json
+import logging
+import threading
+import urllib.error
+import urllib.request
+from collections import deque
+from xml.etree import ElementTree
+
+from fund_index import now_iso
+
+logger = logging.getLogger(__name__)
+
+FEED_FILENAME = "changes.jsonl"
+ATOM_FILENAME = "changes.atom"
+# How many of the latest events the Atom feed carries
+ATOM_ENTRIES = 200
+ATOM_NS = "http://www.w3.org/2005/Atom"
+
+_TITLES = {"new": "New", "updated": "Updated", "removed": "Removed"}
+
+
+class ChangeFeed:
+    """Publish document changes reported by a FundIndex as they happen.
+
+    Every event is appended to ``changes.jsonl`` straight away. flush()
+    rewrites ``changes.atom`` with the latest events and, if a webhook URL is
+    set, POSTs the events gathered since the previous flush as
+    ``{"events": [...]}``. Events come from the index as documents are
+    recorded, so nothing is ever rescanned to find what changed.
+    """
+
+    def __init__(self, download_dir, webhook_url=None):
+        self.path = os.path.join(download_dir, FEED_FILENAME)
+        self.atom_path = os.path.join(download_dir, ATOM_FILENAME)
+        self.webhook_url = webhook_url
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def attach(self, index):
+        index.add_listener(self.record)
+        return self
+
+    def record(self, event):
+        """Append one event to the JSONL feed; called by FundIndex, possibly from download threads."""
+        line = (json.dumps(event, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            self._pending.append(event)
+        logger.info(f"{_TITLES[event['event']]} {event['doc_type']}: {event['name']}")
+
+    def flush(self):
+        """Refresh the Atom feed and notify the webhook of events since the last flush."""
+        with self._lock:
+            events, self._pending = self._pending, []
+        if not events:
+            return 0
+        self.write_atom()
+        if self.webhook_url:
+            self._post(events)
+        return len(events)
+
+    def write_atom(self):
+        """Rewrite the Atom feed from the tail of the JSONL feed."""
+        with open(self.path, "r", encoding="utf-8") as f:
+            latest = [json.loads(line) for line in deque(f, maxlen=ATOM_ENTRIES) if line.strip()]
+
+        ElementTree.register_namespace("", ATOM_NS)
+        feed = ElementTree.Element(f"{{{ATOM_NS}}}feed")
+        ElementTree.SubElement(feed, f"{{{ATOM_NS}}}title").text = "SEBI KIM/SID document changes"
+        ElementTree.SubElement(feed, f"{{{ATOM_NS}}}id").text = "urn:sebi-documents:changes"
+        ElementTree.SubElement(feed, f"{{{ATOM_NS}}}updated").text = latest[-1]["at"] if latest else now_iso()
+        author = ElementTree.SubElement(feed, f"{{{ATOM_NS}}}author")
+        ElementTree.SubElement(author, f"{{{ATOM_NS}}}name").text = "SEBI PDF downloader"
+        for event in reversed(latest):
+            entry = ElementTree.SubElement(feed, f"{{{ATOM_NS}}}entry")
+            ElementTree.SubElement(entry, f"{{{ATOM_NS}}}id").text = (
+                f"urn:sebi-documents:{event['fund_id']}:{event['doc_type']}:{event['event']}:{event['at']}"
+            )
+            ElementTree.SubElement(entry, f"{{{ATOM_NS}}}title").text = (
+                f"{_TITLES[event['event']]} {event['doc_type']}: {event['name']}"
+            )
+            ElementTree.SubElement(entry, f"{{{ATOM_NS}}}updated").text = event["at"]
+            if event.get("url"):
+                ElementTree.SubElement(entry, f"{{{ATOM_NS}}}link", href=event["url"])
+            ElementTree.SubElement(entry, f"{{{ATOM_NS}}}content", type="text").text = (
+                f"sha256 {event.get('old_sha256') or '-'} -> {event.get('new_sha256') or '-'}, "
+                f"size {event.get('old_size') or '-'} -> {event.get('new_size') or '-'}"
+            )
+
+        tmp_path = self.atom_path + ".tmp"
+        ElementTree.ElementTree(feed).write(tmp_path, encoding="utf-8", xml_declaration=True)
+        os.replace(tmp_path, self.atom_path)
+
+    def _post(self, events):
+        body = json.dumps({"events": events}).encode("utf-8")
+        request = urllib.request.Request(self.webhook_url, data=body, method="POST",
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                response.read()
+            logger.info(f"Sent {len(events)} changes to {self.webhook_url}")
+        except (urllib.error.URLError, OSError) as e:
+            # The JSONL feed still has them; a failed webhook should not fail the crawl
+            logger.warning(f"Webhook {self.webhook_url} failed: {str(e)}")
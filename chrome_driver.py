@@ -0,0 +1,200 @@
+import os
+import json
+import logging
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import SessionNotCreatedException
+
+logger = logging.getLogger(__name__)
+
+# Restart the browser after this many funds or this much memory growth
+DEFAULT_MAX_FUNDS_PER_DRIVER = 150
+DEFAULT_MAX_GROWTH_MB = 1024
+
+# Where the resolved chromedriver path is remembered between runs
+DRIVER_PATH_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "sebi-script", "chromedriver.json")
+
+
+def resolve_chromedriver(refresh=False):
+    """Return a chromedriver path, asking webdriver-manager only when the cached one is unusable.
+
+    Returns None if webdriver-manager is not installed, in which case Selenium
+    resolves the driver itself.
+    """
+    if not refresh:
+        try:
+            with open(DRIVER_PATH_CACHE, "r") as f:
+                path = json.load(f).get("path")
+            if path and os.access(path, os.X_OK):
+                return path
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+    except ImportError:
+        return None
+
+    path = ChromeDriverManager().install()
+    logger.info(f"Resolved chromedriver: {path}")
+    os.makedirs(os.path.dirname(DRIVER_PATH_CACHE), exist_ok=True)
+    with open(DRIVER_PATH_CACHE, "w") as f:
+        json.dump({"path": path}, f)
+    return path
+
+
+def create_driver(download_dir):
+    """Start a Chrome driver that saves PDFs into download_dir."""
+    chrome_options = webdriver.ChromeOptions()
+    prefs = {
+        'download.default_directory': os.path.abspath(download_dir),
+        'download.prompt_for_download': False,
+        'download.directory_upgrade': True,
+        'plugins.always_open_pdf_externally': True
+    }
+    chrome_options.add_experimental_option('prefs', prefs)
+    # Network events let the crawler see which PDF a download button fetches
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    path = resolve_chromedriver()
+    try:
+        driver = webdriver.Chrome(service=Service(executable_path=path), options=chrome_options)
+    except SessionNotCreatedException:
+        if path is None:
+            raise
+        # Chrome was probably upgraded past the cached driver
+        logger.info("Cached chromedriver rejected, resolving a new one")
+        path = resolve_chromedriver(refresh=True)
+        driver = webdriver.Chrome(service=Service(executable_path=path), options=chrome_options)
+    driver.maximize_window()
+
+    # PDFs are fetched by download_pdf(), so Chrome itself should never save one
+    try:
+        driver.execute_cdp_cmd('Browser.setDownloadBehavior', {'behavior': 'deny'})
+    except Exception as e:
+        logger.warning(f"Could not disable browser downloads: {str(e)}")
+    return driver
+
+
+def _process_tree_rss_psutil(root_pid):
+    """Sum RSS of root_pid and its descendants using psutil."""
+    import psutil
+
+    root = psutil.Process(root_pid)
+    total = 0
+    for proc in [root] + root.children(recursive=True):
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+def _process_tree_rss_proc(root_pid):
+    """Sum RSS of root_pid and its descendants by walking /proc."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, so split after its closing paren
+        fields = stat[stat.rfind(b")") + 2:].split()
+        children.setdefault(int(fields[1]), []).append(int(entry))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f"/proc/{pid}/statm", "rb") as f:
+                total += int(f.read().split()[1]) * page_size
+        except OSError:
+            continue
+        stack.extend(children.get(pid, ()))
+    return total
+
+
+def driver_memory_mb(driver):
+    """Return RSS of chromedriver plus its browser processes in MB, or None if unknown."""
+    try:
+        pid = driver.service.process.pid
+    except AttributeError:
+        return None
+
+    try:
+        return _process_tree_rss_psutil(pid) / (1024 * 1024)
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.debug(f"psutil memory probe failed: {str(e)}")
+        return None
+
+    if not os.path.isdir("/proc"):
+        return None
+    try:
+        return _process_tree_rss_proc(pid) / (1024 * 1024)
+    except Exception as e:
+        logger.debug(f"/proc memory probe failed: {str(e)}")
+        return None
+
+
+class DriverSession:
+    """Own a Chrome driver and restart it once it has done enough work or grown too large."""
+
+    def __init__(self, download_dir, max_funds=None, max_growth_mb=None):
+        self.download_dir = download_dir
+        self.max_funds = DEFAULT_MAX_FUNDS_PER_DRIVER if max_funds is None else max_funds
+        self.max_growth_mb = DEFAULT_MAX_GROWTH_MB if max_growth_mb is None else max_growth_mb
+        self._driver = None
+        self._baseline_mb = None
+        self._funds = 0
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            self.start()
+        return self._driver
+
+    def start(self):
+        """Launch a fresh browser and record its starting memory footprint."""
+        self._driver = create_driver(self.download_dir)
+        self._baseline_mb = driver_memory_mb(self._driver)
+        self._funds = 0
+        if self._baseline_mb is not None:
+            logger.info(f"Browser started ({self._baseline_mb:.0f} MB)")
+        else:
+            logger.info("Browser started (memory tracking unavailable)")
+
+    def quit(self):
+        """Close the browser if one is running."""
+        if self._driver is not None:
+            try:
+                self._driver.quit()
+            except Exception as e:
+                logger.warning(f"Error closing browser: {str(e)}")
+            self._driver = None
+            logger.info("Browser closed.")
+
+    def restart(self):
+        """Replace the current browser with a fresh one."""
+        self.quit()
+        self.start()
+
+    def note_fund_processed(self):
+        """Count a finished fund and return True when the browser should be recycled."""
+        self._funds += 1
+        if self.max_funds and self._funds >= self.max_funds:
+            logger.info(f"Recycling browser after {self._funds} funds")
+            return True
+
+        if self.max_growth_mb and self._baseline_mb is not None:
+            current_mb = driver_memory_mb(self._driver)
+            if current_mb is not None and current_mb - self._baseline_mb >= self.max_growth_mb:
+                logger.info(f"Recycling browser: memory grew from {self._baseline_mb:.0f} MB to {current_mb:.0f} MB")
+                return True
+        return False
@@ -0,0 +1,182 @@
+import os
+import json
+import mmap
+import uuid
+import struct
+import hashlib
+import logging
+
+from fund_index import now_iso
+from download_receipts import hash_file
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_MAGIC = b"SEBIPK01"
+# Magic, then the JSON header's length as a little-endian uint64
+PREAMBLE = struct.Struct("<8sQ")
+# Documents start on page boundaries so each can also be mapped on its own
+ALIGNMENT = 4096
+COPY_CHUNK_BYTES = 1024 * 1024
+
+EXPORT_STATE_FILENAME = "export_state.json"
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _layout(header, lengths):
+    """Assign absolute, aligned offsets to the header's documents; returns (header bytes, data start)."""
+    data_start = 0
+    while True:
+        offset = data_start
+        for entry, length in zip(header["documents"], lengths):
+            entry["offset"] = offset
+            entry["length"] = length
+            offset = _align(offset + length)
+        encoded = json.dumps(header, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        needed = _align(PREAMBLE.size + len(encoded))
+        # Offsets are part of the header, so repeat until its size stops moving the data
+        if needed == data_start:
+            return encoded, data_start
+        data_start = needed
+
+
+def load_export_state(download_dir):
+    """Return what the last export carried: {"bundle_id": ..., "documents": {"<fund>:<doc>": sha256}}."""
+    try:
+        with open(os.path.join(download_dir, EXPORT_STATE_FILENAME), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"bundle_id": None, "documents": {}}
+
+
+def _save_export_state(download_dir, state):
+    path = os.path.join(download_dir, EXPORT_STATE_FILENAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def export_bundle(index, output_path, incremental=False):
+    """Pack the indexed PDFs into a single bundle file at output_path.
+
+    Layout: ``SEBIPK01``, the header length (uint64 LE), a JSON header, then
+    each PDF at a 4096-aligned absolute offset. Header entries carry fund id,
+    doc type, name, filename, URL, sha256, offset and length. With
+    ``incremental`` only documents whose hash differs from the last export are
+    included, and documents dropped from the index since then are listed under
+    ``removed``; ``base`` names the bundle this one applies on top of.
+    """
+    download_dir = index.download_dir
+    state = load_export_state(download_dir)
+    previous = state["documents"] if incremental else {}
+
+    entries, paths, current = [], [], {}
+    for fund_id, record in sorted(index.funds.items()):
+        for doc_type, document in sorted(record.get("documents", {}).items()):
+            filename = document.get("filename")
+            path = os.path.join(download_dir, filename) if filename else None
+            if not path or not os.path.isfile(path):
+                continue
+            # Files adopted from before receipts existed have no recorded hash
+            sha256 = document.get("sha256") or hash_file(path)[1]
+            key = f"{fund_id}:{doc_type}"
+            current[key] = sha256
+            if previous.get(key) == sha256:
+                continue
+            entries.append({"fund_id": fund_id, "doc_type": doc_type, "name": record.get("name"),
+                            "filename": filename, "url": document.get("url"), "sha256": sha256})
+            paths.append(path)
+
+    removed = sorted(key for key in previous if key not in current)
+    header = {
+        "format": 1,
+        "bundle_id": str(uuid.uuid4()),
+        "base": state.get("bundle_id") if incremental else None,
+        "created_at": now_iso(),
+        "documents": entries,
+        "removed": [dict(zip(("fund_id", "doc_type"), key.rsplit(":", 1))) for key in removed],
+    }
+    encoded, data_start = _layout(header, [os.path.getsize(path) for path in paths])
+
+    tmp_path = output_path + ".part"
+    try:
+        with open(tmp_path, "wb") as out:
+            out.write(PREAMBLE.pack(BUNDLE_MAGIC, len(encoded)))
+            out.write(encoded)
+            for entry, path in zip(entries, paths):
+                out.seek(entry["offset"])
+                digest = hashlib.sha256()
+                copied = 0
+                with open(path, "rb") as f:
+                    while copied < entry["length"]:
+                        chunk = f.read(min(COPY_CHUNK_BYTES, entry["length"] - copied))
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        out.write(chunk)
+                        copied += len(chunk)
+                if copied != entry["length"] or digest.hexdigest() != entry["sha256"]:
+                    raise RuntimeError(f"{entry['filename']} changed while it was being exported; run the export again")
+            out.truncate(max(out.tell(), data_start))
+            out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+
+    _save_export_state(download_dir, {"bundle_id": header["bundle_id"], "exported_at": header["created_at"],
+                                      "documents": current})
+    logger.info(f"Exported {len(entries)} documents ({len(removed)} removed) to {output_path}"
+                + (f" on top of bundle {header['base']}" if header["base"] else ""))
+    return header
+
+
+class Bundle:
+    """Read-only view of a bundle: the header is parsed once and documents are sliced from an mmap.
+
+        with Bundle("corpus.sebipack") as bundle:
+            pdf_bytes = bundle.get("<fund id>", "KIM")
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = PREAMBLE.unpack_from(self._map, 0)
+        if magic != BUNDLE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a SEBI document bundle")
+        self.header = json.loads(self._map[PREAMBLE.size:PREAMBLE.size + header_length])
+        self._entries = {(entry["fund_id"], entry["doc_type"]): entry for entry in self.header["documents"]}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def documents(self):
+        return self.header["documents"]
+
+    def get(self, fund_id, doc_type):
+        """Return a zero-copy memoryview of one document's PDF bytes, or None."""
+        entry = self._entries.get((fund_id, doc_type))
+        if entry is None:
+            return None
+        return memoryview(self._map)[entry["offset"]:entry["offset"] + entry["length"]]
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            # Views returned by get() are still alive; the map is freed with the last of them
+            pass
+        self._file.close()
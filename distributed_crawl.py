@@ -0,0 +1,159 @@
+import os
+import time
+import socket
+import logging
+from urllib.parse import urlsplit
+
+from fund_index import FundIndex
+from change_feed import ChangeFeed
+from refresh_scheduler import build_refresh_queue
+from work_queue import WorkQueue, Heartbeat, DEFAULT_VISIBILITY_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Minimum gap between requests to one host, shared by every worker on the queue
+DEFAULT_MIN_REQUEST_INTERVAL = 1.0
+
+
+def merge_results(index, queue):
+    """Fold finished tasks' results into the fund index; returns how many were merged."""
+    results = queue.collect_results()
+    for task_id, result in results:
+        fund_id, doc_type = result["fund_id"], result["doc_type"]
+        if fund_id not in index.funds:
+            logger.warning(f"Result for unknown fund {fund_id} ({task_id}) ignored")
+            continue
+        if result.get("skipped"):
+            # An offline worker saw a revision it could not download; leave it due for a check
+            continue
+        index.mark_checked(fund_id, doc_type)
+        receipt = result.get("receipt")
+        if receipt:
+            index.record_document(fund_id, doc_type, receipt["filename"], url=receipt["url"], receipt=receipt)
+        elif result.get("adopt"):
+            # A file from before the index; remember the URL it corresponds to
+            document = index.get_document(fund_id, doc_type) or {}
+            index.record_document(fund_id, doc_type, result["filename"], url=result["pdf_url"],
+                                  downloaded_at=document.get("downloaded_at"))
+    if results:
+        index.save()
+    return len(results)
+
+
+def run_coordinator(download_dir, queue_path, doc_types, wait=True, poll_seconds=10, webhook_url=None):
+    """Publish one refresh task per indexed document and merge what workers report back.
+
+    The fund index built by the browser crawl is the discovery manifest. Tasks
+    carry everything a worker needs, including the filename the index assigned,
+    so workers never write the index themselves. Changes found in merged
+    results go to the change feed as they are merged.
+    """
+    index = FundIndex(download_dir)
+    feed = ChangeFeed(download_dir, webhook_url).attach(index)
+    queue = WorkQueue(queue_path)
+
+    # Results left over from an earlier coordinator must land before tasks are re-armed
+    merge_results(index, queue)
+    feed.flush()
+
+    tasks = []
+    for priority, fund_id, doc_type, detail_url in build_refresh_queue(index, doc_types):
+        filename = index.document_filename(fund_id, doc_type)
+        document = index.get_document(fund_id, doc_type) or {}
+        payload = {
+            "fund_id": fund_id,
+            "doc_type": doc_type,
+            "name": index.funds[fund_id]["name"],
+            "detail_url": detail_url,
+            "filename": filename,
+            "known_url": document.get("url"),
+            "have_file": bool(document),
+        }
+        tasks.append((f"{doc_type}:{fund_id}", payload, priority))
+    index.save()
+    published = queue.publish(tasks)
+    logger.info(f"Published {published} of {len(tasks)} tasks to {queue_path}")
+
+    while wait:
+        merged = merge_results(index, queue)
+        counts = queue.counts()
+        if merged:
+            logger.info(f"Merged {merged} results; queue: {counts}")
+            feed.flush()
+        if not counts.get("pending") and not counts.get("leased"):
+            break
+        time.sleep(poll_seconds)
+
+    # A task may have finished between the last merge and the counts that ended the loop
+    if merge_results(index, queue):
+        feed.flush()
+    counts = queue.counts()
+    logger.info(f"Coordinator finished; queue: {counts}")
+    return counts
+
+
+def _work_on_task(queue, payload, download_dir, cache, min_request_interval):
+    """Check one fund's details page and download its PDF if it changed."""
+    from pdf_download import fetch_page, find_pdf_url, download_pdf
+
+    result = {"fund_id": payload["fund_id"], "doc_type": payload["doc_type"]}
+    # Pages served from the cache do not use up the shared rate limit
+    details_host = urlsplit(payload["detail_url"]).netloc
+    pdf_url = find_pdf_url(fetch_page(
+        payload["detail_url"], cache=cache,
+        before_request=lambda: queue.acquire_rate_slot(details_host, min_request_interval),
+    ))
+    result["pdf_url"] = pdf_url
+    if not pdf_url or pdf_url == payload["known_url"]:
+        return result
+    if payload["have_file"] and not payload["known_url"]:
+        result["adopt"] = True
+        result["filename"] = payload["filename"]
+        return result
+    if cache is not None and cache.offline:
+        logger.info(f"Offline: would download {pdf_url} for {payload['name']}")
+        result["skipped"] = True
+        return result
+
+    queue.acquire_rate_slot(urlsplit(pdf_url).netloc, min_request_interval)
+    receipt = download_pdf(pdf_url, payload["filename"], download_dir,
+                           fund_id=payload["fund_id"], doc_type=payload["doc_type"])
+    if not receipt:
+        raise RuntimeError(f"Download of {pdf_url} failed")
+    result["receipt"] = receipt
+    return result
+
+
+def run_worker(download_dir, queue_path, worker_id=None, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT,
+               min_request_interval=DEFAULT_MIN_REQUEST_INTERVAL, cache=None, keep_running=False, idle_poll=5):
+    """Lease and process tasks until the queue is empty (or forever with keep_running)."""
+    queue = WorkQueue(queue_path)
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    done = failed = 0
+    logger.info(f"Worker {worker_id} started on {queue_path}")
+
+    while True:
+        task = queue.lease(worker_id, visibility_timeout)
+        if task is None:
+            if not keep_running:
+                break
+            time.sleep(idle_poll)
+            continue
+
+        payload = task.payload
+        logger.info(f"Task {task.id}: {payload['name']} (attempt {task.attempts})")
+        try:
+            with Heartbeat(queue, task, worker_id, visibility_timeout) as heartbeat:
+                result = _work_on_task(queue, payload, download_dir, cache, min_request_interval)
+            # Another worker has the task now; its result is the one that counts
+            if heartbeat.lost or not queue.complete(task.id, worker_id, result):
+                logger.warning(f"Task {task.id} was re-leased to another worker - result dropped")
+                continue
+            done += 1
+        except Exception as e:
+            logger.error(f"Task {task.id} failed: {str(e)}")
+            queue.fail(task.id, worker_id, str(e))
+            failed += 1
+
+    logger.info(f"Worker {worker_id} finished: {done} done, {failed} failed")
+    return done, failed
@@ -1,13 +1,13 @@
 import os
-import time
-import requests
-import json
 import logging
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+import argparse
+import functools
+from datetime import datetime, timezone
+
+from fund_index import FundIndex, now_iso, parse_iso
+
+# Selenium and requests are imported inside the functions that need them, so
+# --help, HTTP-only runs and runs with nothing to do never pay for the browser stack.
 
 # Set up logging
 logging.basicConfig(
@@ -20,399 +20,386 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Progress tracker functions
-def save_progress(doc_type, category_index, fund_index):
-    """Save current progress to a file."""
-    progress = {
-        "doc_type": doc_type,
-        "category_index": category_index,
-        "fund_index": fund_index
-    }
-    with open("download_progress.json", "w") as f:
-        json.dump(progress, f)
-    logger.info(f"Progress saved: {doc_type}, category {category_index}, fund {fund_index}")
-
-def load_progress():
-    """Load progress from file."""
+DOC_TYPES = ["KIM", "SID"]
+# A crawl that finds more than this share of a doc type gone is more likely broken than right
+MAX_RETIRED_FRACTION = 0.2
+
+def crawled_recently(index, min_interval_hours):
+    """True if the last full crawl finished less than min_interval_hours ago."""
+    last_crawl = index.meta.get("last_full_crawl")
+    if min_interval_hours is None or not last_crawl:
+        return False
+    age_hours = (datetime.now(timezone.utc) - parse_iso(last_crawl)).total_seconds() / 3600
+    return age_hours < min_interval_hours
+
+def refresh_over_http(index, downloads, cache=None, budget=None, doc_types=DOC_TYPES):
+    """Re-check indexed funds' details pages over plain HTTP and queue revised PDFs.
+
+    Funds are visited most-likely-changed first (never-fetched ones lead), and
+    the run stops early once the budget is spent. Details pages go through the
+    HTTP cache when one is given; an offline cache only reports which PDFs
+    would be downloaded and leaves those documents unchecked. Returns True only
+    if every details page was fetched and nothing was left undownloaded, so an
+    offline run never counts as a refresh.
+    """
+    from pdf_download import fetch_page, find_pdf_url
+    from refresh_scheduler import build_refresh_queue
+
+    queue = build_refresh_queue(index, doc_types)
+    logger.info(f"{len(queue)} documents to check")
+    offline = cache is not None and cache.offline
+    fetched = failed = 0
+    for checked, (priority, fund_id, doc_type, detail_url) in enumerate(queue):
+        if budget is not None and budget.exhausted():
+            logger.info(f"Budget spent ({budget.describe()}) - {len(queue) - checked} documents left for next time")
+            return False
+
+        record = index.funds[fund_id]
+        hits_before = cache.hits if cache is not None else 0
+        try:
+            pdf_url = find_pdf_url(fetch_page(detail_url, cache=cache))
+        except Exception as e:
+            logger.error(f"Error fetching {detail_url} for {record['name']}: {str(e)}")
+            failed += 1
+            continue
+        finally:
+            if budget is not None and (cache is None or cache.hits == hits_before):
+                budget.spend()
+        fetched += 1
+        document = index.get_document(fund_id, doc_type)
+        # A new document, or a revised one; adopted files without a URL are not downloaded again
+        needs_download = bool(pdf_url) and (document is None or (document.get("url") not in (None, pdf_url)))
+        if needs_download and offline:
+            # Not marked checked: the revision is still waiting for a run that can download it
+            logger.info(f"Offline: would download {pdf_url} for {record['name']}")
+            continue
+        if needs_download and budget is not None and budget.exhausted():
+            # Left unchecked so the document stays at the front of the queue next time
+            logger.info(f"Budget spent ({budget.describe()}) - {record['name']} {doc_type} left for next time")
+            index.save()
+            return False
+
+        index.mark_checked(fund_id, doc_type)
+        if not pdf_url:
+            logger.warning(f"No PDF found on details page for {record['name']}")
+            continue
+
+        if document and document.get("url") == pdf_url:
+            continue
+        filename = index.document_filename(fund_id, doc_type)
+        if document and not document.get("url"):
+            # A file adopted from before the index; trust it and remember where it lives
+            index.record_document(fund_id, doc_type, filename, url=pdf_url, downloaded_at=document.get("downloaded_at"))
+            index.save()
+        else:
+            logger.info(f"Queueing {record['name']} {doc_type} (change likelihood {priority:.2f})")
+            if budget is not None:
+                budget.spend()
+            downloads.submit(pdf_url, filename, index.download_dir, fund_id=fund_id, doc_type=doc_type,
+                             on_success=functools.partial(index.record_download, fund_id, doc_type))
+    index.save()
+    if failed:
+        logger.warning(f"{failed} of {len(queue)} details pages could not be fetched")
+    return fetched > 0 and not failed and not offline
+
+def audit_downloads(download_dir="downloads", workers=None):
+    """Re-hash every downloaded PDF and log missing, corrupt, orphaned and stale files."""
+    from download_receipts import audit
+
+    report = audit(download_dir, index=FundIndex(download_dir), workers=workers)
+    logger.info(f"Audit of {download_dir}: {report['ok']} ok")
+    for problem in ("missing", "corrupt", "orphaned", "stale", "unverified"):
+        if report[problem]:
+            logger.info(f"{len(report[problem])} {problem}:")
+            for filename in report[problem]:
+                logger.info(f"  {filename}")
+    return report
+
+def start_recording(archive_path, download_dir):
+    """Archive every HTTP exchange of this run, starting from a snapshot of the fund index."""
+    import shutil
+    from fund_index import INDEX_FILENAME
+    from pdf_download import install_adapter
+    from record_replay import RecordingAdapter, WarcWriter, index_snapshot_path
+
+    index_path = os.path.join(download_dir, INDEX_FILENAME)
+    if os.path.exists(index_path):
+        shutil.copyfile(index_path, index_snapshot_path(archive_path))
+    install_adapter(RecordingAdapter(WarcWriter(archive_path)))
+    logger.info(f"Recording HTTP exchanges to {archive_path}")
+
+def start_replay(archive_path):
+    """Serve every HTTP request of this run from a recorded archive."""
+    from pdf_download import install_adapter
+    from record_replay import ReplayAdapter, WarcArchive
+
     try:
-        with open("download_progress.json", "r") as f:
-            progress = json.load(f)
-        logger.info(f"Resuming from: {progress['doc_type']}, category {progress['category_index']}, fund {progress['fund_index']}")
-        return progress["doc_type"], progress["category_index"], progress["fund_index"]
-    except (FileNotFoundError, json.JSONDecodeError):
-        logger.info("No progress file found or invalid format. Starting from beginning.")
-        return None, 0, 0
-
-def download_sebi_documents(download_dir="downloads"):
+        archive = WarcArchive(archive_path)
+    except FileNotFoundError:
+        logger.error(f"No recording at {archive_path} (the archive and its .idx file are both needed)")
+        return False
+    if not len(archive):
+        logger.error(f"{archive_path} has no recorded responses")
+        archive.close()
+        return False
+    install_adapter(ReplayAdapter(archive))
+    logger.info(f"Replaying {len(archive)} recorded responses from {archive_path}")
+    return True
+
+def profile_replay(archive_path, download_dir="downloads", top=25, output=None):
+    """Replay a recorded --http-only run under cProfile and report where the time goes.
+
+    The run works on a copy of the fund index as it was when recording began
+    (or the current one if there is no snapshot) in a scratch directory, with
+    no HTTP cache and downloads done inline, so every replay does the same work
+    on one thread.
+    """
+    import shutil
+    import pstats
+    import cProfile
+    import tempfile
+    from fund_index import INDEX_FILENAME
+    from record_replay import index_snapshot_path, report_profile
+
+    if not start_replay(archive_path):
+        return False
+    snapshot = index_snapshot_path(archive_path)
+    if not os.path.exists(snapshot):
+        snapshot = os.path.join(download_dir, INDEX_FILENAME)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if os.path.exists(snapshot):
+            shutil.copyfile(snapshot, os.path.join(work_dir, INDEX_FILENAME))
+        profiler = cProfile.Profile()
+        profiler.enable()
+        download_sebi_documents(work_dir, http_only=True, download_workers=0)
+        profiler.disable()
+
+    if output:
+        profiler.dump_stats(output)
+        logger.info(f"Profile written to {output}")
+    report_profile(pstats.Stats(profiler), top=top)
+    return True
+
+def download_sebi_documents(download_dir="downloads", http_only=False, min_interval_hours=None,
+                            max_funds_per_driver=None, max_driver_growth_mb=None, cache=None,
+                            budget_minutes=None, budget_requests=None, download_workers=4, webhook_url=None):
     """Download KIM and SID PDFs from SEBI website."""
     # Create download directory
     if not os.path.exists(download_dir):
         os.makedirs(download_dir)
         logger.info(f"Created download directory: {download_dir}")
-    
-    # Load progress if available
-    last_doc_type, last_category_index, last_fund_index = load_progress()
-    
-    # Configure Chrome options
-    chrome_options = webdriver.ChromeOptions()
-    prefs = {
-        'download.default_directory': os.path.abspath(download_dir),
-        'download.prompt_for_download': False,
-        'download.directory_upgrade': True,
-        'plugins.always_open_pdf_externally': True
-    }
-    chrome_options.add_experimental_option('prefs', prefs)
-    
-    # Initialize driver
-    driver = webdriver.Chrome(options=chrome_options)
-    driver.maximize_window()
-    
+
+    index = FundIndex(download_dir)
+    if crawled_recently(index, min_interval_hours):
+        logger.info(f"Last full crawl finished at {index.meta['last_full_crawl']} - nothing to do")
+        return
+
+    from change_feed import ChangeFeed
+    from pdf_download import DownloadPool
+    feed = ChangeFeed(download_dir, webhook_url).attach(index)
+    downloads = DownloadPool(max_workers=download_workers)
+
+    if http_only:
+        from refresh_scheduler import Budget
+        budget = None
+        if budget_minutes is not None or budget_requests is not None:
+            budget = Budget(max_seconds=budget_minutes * 60 if budget_minutes is not None else None,
+                            max_requests=budget_requests)
+        try:
+            completed = refresh_over_http(index, downloads, cache=cache, budget=budget)
+        finally:
+            # The time budget covers the downloads the refresh queued, not just the page checks
+            downloads.close(timeout=budget.remaining_seconds() if budget is not None else None)
+            if cache is not None:
+                logger.info(f"HTTP cache: {cache.hits} hits, {cache.misses} misses")
+        if downloads.stats["cancelled"]:
+            completed = False
+        if completed:
+            # Kept apart from last_full_crawl: only the browser crawl finds new and withdrawn funds
+            index.meta["last_http_refresh"] = now_iso()
+            logger.info("\nAll indexed funds refreshed.")
+        index.save()
+        feed.flush()
+        return
+
+    from chrome_driver import DriverSession
+    from browser_crawl import crawl_document_type, load_progress, save_progress, clear_progress
+
+    # Determine where to start
+    doc_types = list(DOC_TYPES)
+    last_doc_type, _, _ = load_progress()
+    if last_doc_type in doc_types:
+        doc_types = doc_types[doc_types.index(last_doc_type):]
+    else:
+        # Funds not listed again between now and the end of this crawl have been withdrawn
+        index.meta["crawl_started"] = now_iso()
+        index.meta["crawl_errors"] = 0
+        index.meta["crawl_listed"] = {}
+        index.save()
+
+    session = DriverSession(download_dir, max_funds=max_funds_per_driver, max_growth_mb=max_driver_growth_mb)
     try:
-        # Determine where to start
-        start_with_kim = last_doc_type is None or last_doc_type == "KIM"
-        
-        # Process KIM documents if needed
-        if start_with_kim:
-            kim_url = "https://www.sebi.gov.in/sebiweb/other/OtherAction.do?doMutualFund=yes&mftype=3"
-            logger.info(f"\n--- Processing KIM documents ---")
-            logger.info(f"Navigating to KIM page: {kim_url}")
-            driver.get(kim_url)
-            
-            # Wait for page to load
-            WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "table")))
-            logger.info("KIM page loaded successfully.")
-            
-            # Find all links in the table (including JavaScript links)
-            js_links = driver.find_elements(By.XPATH, "//table//a[contains(@onclick, 'getmutuakFund') or contains(@href, 'javascript:getmutuakFund')]")
-            if not js_links:
-                js_links = driver.find_elements(By.XPATH, "//table//a")
-                logger.info(f"Found {len(js_links)} links on KIM page, checking for JavaScript links...")
-                
-                # Filter for JavaScript links
-                js_links = [link for link in js_links if 'javascript:' in link.get_attribute('href') or 'javascript:' in link.get_attribute('onclick') or 'getmutuakFund' in link.get_attribute('onclick')]
-            
-            logger.info(f"Found {len(js_links)} mutual fund category links")
-            
-            # Process each category link
-            for i, js_link in enumerate(js_links):
-                # Skip categories we've already processed
-                if last_doc_type == "KIM" and i < last_category_index:
-                    logger.info(f"Skipping already processed category {i+1}")
-                    continue
-                
-                try:
-                    category_name = js_link.text.strip()
-                    logger.info(f"Processing category {i+1}: {category_name}")
-                    
-                    # Click on the JavaScript link
-                    js_link.click()
-                    time.sleep(3)
-                    
-                    # Switch to the new tab if opened
-                    if len(driver.window_handles) > 1:
-                        driver.switch_to.window(driver.window_handles[-1])
-                    
-                    # Wait for fund list page to load
-                    WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "table")))
-                    logger.info("Fund list page loaded.")
-                    
-                    # Find all fund detail JavaScript links
-                    fund_links = driver.find_elements(By.XPATH, "//table//a[contains(@onclick, 'getfundDetails') or contains(@href, 'javascript:getfundDetails')]")
-                    if not fund_links:
-                        fund_links = driver.find_elements(By.XPATH, "//table//a")
-                        logger.info(f"Found {len(fund_links)} links on fund list page, checking for JavaScript links...")
-                        
-                        # Filter for JavaScript links
-                        fund_links = [link for link in fund_links if 'javascript:' in link.get_attribute('href') or 'javascript:' in link.get_attribute('onclick') or 'getfundDetails' in link.get_attribute('onclick')]
-                    
-                    logger.info(f"Found {len(fund_links)} fund links")
-                    
-                    # Process each fund link
-                    for j, fund_link in enumerate(fund_links):
-                        # Skip funds we've already processed
-                        if last_doc_type == "KIM" and i == last_category_index and j < last_fund_index:
-                            logger.info(f"Skipping already processed fund {j+1}")
-                            continue
-                        
-                        try:
-                            fund_name = fund_link.text.strip()
-                            logger.info(f"Processing fund {j+1}: {fund_name}")
-                            
-                            # Save current progress
-                            save_progress("KIM", i, j)
-                            
-                            # Click on the fund link
-                            fund_link.click()
-                            time.sleep(3)
-                            
-                            # Switch to the new tab if opened
-                            if len(driver.window_handles) > 2:
-                                driver.switch_to.window(driver.window_handles[-1])
-                            
-                            # Wait for fund details page to load
-                            time.sleep(3)
-                            
-                            # Look for the download button
-                            try:
-                                download_button = driver.find_element(By.CSS_SELECTOR, "#secondaryDownload")
-                                logger.info(f"Found download button for {fund_name}")
-                                
-                                # Create filename for checking if already downloaded
-                                safe_name = fund_name.replace(" ", "_").replace("/", "_")
-                                if not safe_name:
-                                    safe_name = f"fund_{j+1}"
-                                filename = f"{safe_name}_KIM.pdf"
-                                filepath = os.path.join(download_dir, filename)
-                                
-                                # Check if file already exists
-                                if os.path.exists(filepath):
-                                    logger.info(f"File already exists: {filename} - skipping download")
-                                else:
-                                    # Click the download button
-                                    download_button.click()
-                                    logger.info(f"Clicked download button for {fund_name}")
-                                    time.sleep(3)
-                            except NoSuchElementException:
-                                logger.info(f"No download button found for {fund_name}")
-                                
-                                # Try alternative methods - look for iframe
-                                try:
-                                    iframe = driver.find_element(By.XPATH, "//iframe[contains(@src, '.pdf')]")
-                                    src = iframe.get_attribute("src")
-                                    if "file=" in src:
-                                        pdf_url = src.split("file=")[1]
-                                        if "&" in pdf_url:
-                                            pdf_url = pdf_url.split("&")[0]
-                                        
-                                        # Create filename
-                                        safe_name = fund_name.replace(" ", "_").replace("/", "_")
-                                        if not safe_name:
-                                            safe_name = f"fund_{j+1}"
-                                        filename = f"{safe_name}_KIM.pdf"
-                                        
-                                        # Download PDF directly
-                                        logger.info(f"Downloading PDF from iframe: {pdf_url}")
-                                        download_pdf(pdf_url, filename, download_dir)
-                                except NoSuchElementException:
-                                    logger.warning(f"No iframe found for {fund_name}")
-                            
-                            # Close fund details tab and switch back to fund list tab
-                            if len(driver.window_handles) > 2:
-                                driver.close()
-                                driver.switch_to.window(driver.window_handles[-1])
-                        except Exception as e:
-                            logger.error(f"Error processing fund {fund_name}: {str(e)}")
-                            # Make sure we're back on the fund list tab
-                            if len(driver.window_handles) > 2:
-                                driver.close()
-                                driver.switch_to.window(driver.window_handles[-1])
-                    
-                    # Close fund list tab and switch back to main tab
-                    if len(driver.window_handles) > 1:
-                        driver.close()
-                        driver.switch_to.window(driver.window_handles[0])
-                except Exception as e:
-                    logger.error(f"Error processing category {category_name}: {str(e)}")
-                    # Make sure we're back on the main tab
-                    while len(driver.window_handles) > 1:
-                        driver.close()
-                        driver.switch_to.window(driver.window_handles[0])
-            
-            # Reset progress for SID
-            save_progress("SID", 0, 0)
-        
-        # Process SID documents
-        sid_url = "https://www.sebi.gov.in/sebiweb/other/OtherAction.do?doMutualFund=yes&mftype=2"
-        logger.info(f"\n--- Processing SID documents ---")
-        logger.info(f"Navigating to SID page: {sid_url}")
-        driver.get(sid_url)
-        
-        # Wait for page to load
-        WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "table")))
-        logger.info("SID page loaded successfully.")
-        
-        # Find all links in the table (including JavaScript links)
-        js_links = driver.find_elements(By.XPATH, "//table//a[contains(@onclick, 'getmutuakFund') or contains(@href, 'javascript:getmutuakFund')]")
-        if not js_links:
-            js_links = driver.find_elements(By.XPATH, "//table//a")
-            logger.info(f"Found {len(js_links)} links on SID page, checking for JavaScript links...")
-            
-            # Filter for JavaScript links
-            js_links = [link for link in js_links if 'javascript:' in link.get_attribute('href') or 'javascript:' in link.get_attribute('onclick') or 'getmutuakFund' in link.get_attribute('onclick')]
-        
-        logger.info(f"Found {len(js_links)} mutual fund category links")
-        
-        # Process each category link
-        for i, js_link in enumerate(js_links):
-            # Skip categories we've already processed
-            if last_doc_type == "SID" and i < last_category_index:
-                logger.info(f"Skipping already processed category {i+1}")
-                continue
-            
-            try:
-                category_name = js_link.text.strip()
-                logger.info(f"Processing category {i+1}: {category_name}")
-                
-                # Click on the JavaScript link
-                js_link.click()
-                time.sleep(3)
-                
-                # Switch to the new tab if opened
-                if len(driver.window_handles) > 1:
-                    driver.switch_to.window(driver.window_handles[-1])
-                
-                # Wait for fund list page to load
-                WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "table")))
-                logger.info("Fund list page loaded.")
-                
-                # Find all fund detail JavaScript links
-                fund_links = driver.find_elements(By.XPATH, "//table//a[contains(@onclick, 'getfundDetails') or contains(@href, 'javascript:getfundDetails')]")
-                if not fund_links:
-                    fund_links = driver.find_elements(By.XPATH, "//table//a")
-                    logger.info(f"Found {len(fund_links)} links on fund list page, checking for JavaScript links...")
-                    
-                    # Filter for JavaScript links
-                    fund_links = [link for link in fund_links if 'javascript:' in link.get_attribute('href') or 'javascript:' in link.get_attribute('onclick') or 'getfundDetails' in link.get_attribute('onclick')]
-                
-                logger.info(f"Found {len(fund_links)} fund links")
-                
-                # Process each fund link
-                for j, fund_link in enumerate(fund_links):
-                    # Skip funds we've already processed
-                    if last_doc_type == "SID" and i == last_category_index and j < last_fund_index:
-                        logger.info(f"Skipping already processed fund {j+1}")
-                        continue
-                    
-                    try:
-                        fund_name = fund_link.text.strip()
-                        logger.info(f"Processing fund {j+1}: {fund_name}")
-                        
-                        # Save current progress
-                        save_progress("SID", i, j)
-                        
-                        # Click on the fund link
-                        fund_link.click()
-                        time.sleep(3)
-                        
-                        # Switch to the new tab if opened
-                        if len(driver.window_handles) > 2:
-                            driver.switch_to.window(driver.window_handles[-1])
-                        
-                        # Wait for fund details page to load
-                        time.sleep(3)
-                        
-                        # Look for the download button
-                        try:
-                            download_button = driver.find_element(By.CSS_SELECTOR, "#secondaryDownload")
-                            logger.info(f"Found download button for {fund_name}")
-                            
-                            # Create filename for checking if already downloaded
-                            safe_name = fund_name.replace(" ", "_").replace("/", "_")
-                            if not safe_name:
-                                safe_name = f"fund_{j+1}"
-                            filename = f"{safe_name}_SID.pdf"
-                            filepath = os.path.join(download_dir, filename)
-                            
-                            # Check if file already exists
-                            if os.path.exists(filepath):
-                                logger.info(f"File already exists: {filename} - skipping download")
-                            else:
-                                # Click the download button
-                                download_button.click()
-                                logger.info(f"Clicked download button for {fund_name}")
-                                time.sleep(3)
-                        except NoSuchElementException:
-                            logger.info(f"No download button found for {fund_name}")
-                            
-                            # Try alternative methods - look for iframe
-                            try:
-                                iframe = driver.find_element(By.XPATH, "//iframe[contains(@src, '.pdf')]")
-                                src = iframe.get_attribute("src")
-                                if "file=" in src:
-                                    pdf_url = src.split("file=")[1]
-                                    if "&" in pdf_url:
-                                        pdf_url = pdf_url.split("&")[0]
-                                    
-                                    # Create filename
-                                    safe_name = fund_name.replace(" ", "_").replace("/", "_")
-                                    if not safe_name:
-                                        safe_name = f"fund_{j+1}"
-                                    filename = f"{safe_name}_SID.pdf"
-                                    
-                                    # Download PDF directly
-                                    logger.info(f"Downloading PDF from iframe: {pdf_url}")
-                                    download_pdf(pdf_url, filename, download_dir)
-                            except NoSuchElementException:
-                                logger.warning(f"No iframe found for {fund_name}")
-                        
-                        # Close fund details tab and switch back to fund list tab
-                        if len(driver.window_handles) > 2:
-                            driver.close()
-                            driver.switch_to.window(driver.window_handles[-1])
-                    except Exception as e:
-                        logger.error(f"Error processing fund {fund_name}: {str(e)}")
-                        # Make sure we're back on the fund list tab
-                        if len(driver.window_handles) > 2:
-                            driver.close()
-                            driver.switch_to.window(driver.window_handles[-1])
-                
-                # Close fund list tab and switch back to main tab
-                if len(driver.window_handles) > 1:
-                    driver.close()
-                    driver.switch_to.window(driver.window_handles[0])
-            except Exception as e:
-                logger.error(f"Error processing category {category_name}: {str(e)}")
-                # Make sure we're back on the main tab
-                while len(driver.window_handles) > 1:
-                    driver.close()
-                    driver.switch_to.window(driver.window_handles[0])
-        
+        for position, doc_type in enumerate(doc_types):
+            crawl_document_type(session, index, downloads, doc_type, download_dir)
+
+            # Reset progress for the next document type
+            if position + 1 < len(doc_types):
+                save_progress(doc_types[position + 1], 0, 0)
+
+        # Let queued downloads land before declaring the crawl complete
+        downloads.close()
         logger.info("\nAll documents processed successfully.")
+        crawl_started = index.meta.pop("crawl_started", None)
+        crawl_errors = index.meta.pop("crawl_errors", 0)
+        crawl_listed = index.meta.pop("crawl_listed", {})
+        if crawl_started and crawl_errors:
+            logger.warning(f"Not checking for withdrawn funds: {crawl_errors} categories or funds failed during the crawl")
+        elif crawl_started:
+            listed_types = [doc_type for doc_type in DOC_TYPES if crawl_listed.get(doc_type)]
+            for doc_type in DOC_TYPES:
+                if doc_type not in listed_types:
+                    logger.warning(f"Not checking for withdrawn {doc_type} funds: none were listed during the crawl")
+            retired = index.retire_unlisted(parse_iso(crawl_started), listed_types,
+                                            max_fraction=MAX_RETIRED_FRACTION)
+            if retired:
+                logger.info(f"{retired} documents are no longer listed")
+        index.meta["last_full_crawl"] = now_iso()
+        index.save()
         # Clear progress file when done
-        if os.path.exists("download_progress.json"):
-            os.remove("download_progress.json")
-            logger.info("Progress file cleared.")
-    
+        clear_progress()
+
     except Exception as e:
         logger.error(f"Error: {str(e)}")
     finally:
-        driver.quit()
-        logger.info("Browser closed.")
-
-def download_pdf(url, filename, download_dir, max_retries=3):
-    """Download PDF directly using requests with retry mechanism."""
-    filepath = os.path.join(download_dir, filename)
-    
-    # Check if file already exists
-    if os.path.exists(filepath):
-        logger.info(f"File already exists: {filename} - skipping download")
-        return True
-    
-    for attempt in range(max_retries):
+        session.quit()
+        downloads.close()
+        feed.flush()
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Download KIM and SID PDFs from the SEBI website.")
+    parser.add_argument("--download-dir", default="downloads", help="Directory PDFs are saved to (default: downloads)")
+    parser.add_argument("--http-only", action="store_true",
+                        help="Re-check funds already in the fund index over plain HTTP without starting Chrome")
+    parser.add_argument("--min-interval-hours", type=float,
+                        help="Exit straight away if the last full crawl finished less than this many hours ago")
+    parser.add_argument("--max-funds-per-driver", type=int, help="Restart Chrome after this many funds (default: 150)")
+    parser.add_argument("--max-driver-growth-mb", type=int,
+                        help="Restart Chrome once its memory has grown by this many MB (default: 1024)")
+    parser.add_argument("--cache-dir", default=".http_cache", help="Where fetched HTML pages are cached (default: .http_cache)")
+    parser.add_argument("--cache-ttl-hours", type=float, default=6, help="Re-fetch cached pages older than this (default: 6)")
+    parser.add_argument("--cache-max-mb", type=int, default=200, help="Evict least recently used pages beyond this size (default: 200)")
+    parser.add_argument("--no-cache", action="store_true", help="Always fetch pages from the network")
+    parser.add_argument("--offline", action="store_true",
+                        help="Serve pages only from the cache, whatever their age, and download nothing")
+    parser.add_argument("--download-workers", type=int, default=4,
+                        help="Concurrent PDF downloads; 0 downloads inline (default: 4)")
+    parser.add_argument("--record", metavar="ARCHIVE", help="Save every HTTP exchange of this run to a .warc.gz archive")
+    parser.add_argument("--replay", metavar="ARCHIVE", help="Answer every HTTP request from a recorded archive")
+    parser.add_argument("--webhook", metavar="URL",
+                        help="POST new, updated and removed documents to this URL as JSON after each run")
+    parser.add_argument("--budget-minutes", type=float,
+                        help="With --http-only, stop checking funds after this many minutes")
+    parser.add_argument("--budget-requests", type=int,
+                        help="With --http-only, stop checking funds after this many network requests")
+    subparsers = parser.add_subparsers(dest="command")
+    audit_parser = subparsers.add_parser("audit", help="Verify downloaded PDFs against their receipts")
+    audit_parser.add_argument("--workers", type=int, help="Hashing processes (default: one per CPU)")
+    coordinator_parser = subparsers.add_parser("coordinator",
+                                               help="Publish fund refresh tasks to a shared queue and merge results")
+    coordinator_parser.add_argument("--queue", required=True, help="SQLite queue file, e.g. on a shared volume")
+    coordinator_parser.add_argument("--no-wait", action="store_true", help="Publish tasks and exit without waiting")
+    coordinator_parser.add_argument("--poll-seconds", type=float, default=10, help="How often to merge results (default: 10)")
+    worker_parser = subparsers.add_parser("worker", help="Process fund refresh tasks from a shared queue")
+    worker_parser.add_argument("--queue", required=True, help="SQLite queue file shared with the coordinator")
+    worker_parser.add_argument("--worker-id", help="Name for this worker (default: host:pid)")
+    worker_parser.add_argument("--visibility-timeout", type=float, default=300,
+                               help="Seconds a leased task stays hidden from other workers between heartbeats (default: 300)")
+    worker_parser.add_argument("--min-request-interval", type=float, default=1.0,
+                               help="Minimum seconds between requests to one host across all workers (default: 1)")
+    worker_parser.add_argument("--keep-running", action="store_true", help="Wait for new tasks instead of exiting when idle")
+    profile_parser = subparsers.add_parser("profile", help="Replay a recorded --http-only run under cProfile")
+    profile_parser.add_argument("archive", help="Archive written by --record")
+    profile_parser.add_argument("--top", type=int, default=25, help="How many functions to list (default: 25)")
+    profile_parser.add_argument("--output", help="Also save the raw profile here for pstats or snakeviz")
+    export_parser = subparsers.add_parser("export", help="Pack the downloaded PDFs into one memory-mappable bundle file")
+    export_parser.add_argument("output", help="Bundle file to write, e.g. corpus.sebipack")
+    export_parser.add_argument("--incremental", action="store_true",
+                               help="Only include documents that changed since the last export")
+    ocr_parser = subparsers.add_parser("ocr", help="OCR the scanned (image-only) pages of downloaded PDFs")
+    ocr_parser.add_argument("--workers", type=int, help="OCR processes (default: a quarter of the CPUs)")
+    ocr_parser.add_argument("--max-pages-per-minute", type=float, help="Start no more than this many pages per minute")
+    ocr_parser.add_argument("--lang", default="eng", help="Tesseract language(s), e.g. eng+hin (default: eng)")
+    ocr_parser.add_argument("--dpi", type=int, default=300, help="Resolution pages are rendered at (default: 300)")
+    args = parser.parse_args(argv)
+
+    if args.record and args.replay:
+        parser.error("--record and --replay cannot be combined")
+    if args.record and args.offline:
+        parser.error("--record needs the network and cannot be combined with --offline")
+
+    if args.command == "audit":
+        report = audit_downloads(args.download_dir, workers=args.workers)
+        return 1 if report["missing"] or report["corrupt"] else 0
+
+    if args.command == "export":
+        from corpus_bundle import export_bundle
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            logger.info(f"Download attempt {attempt+1}/{max_retries} for {filename}")
-            response = requests.get(url, headers=headers, stream=True, timeout=30)
-            response.raise_for_status()
-            
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            
-            logger.info(f"Downloaded: {filename}")
-            return True
-        except Exception as e:
-            logger.warning(f"Attempt {attempt+1} failed to download {url}: {str(e)}")
-            if attempt < max_retries - 1:
-                wait_time = 2 * (attempt + 1)  # Exponential backoff
-                logger.info(f"Waiting {wait_time} seconds before retrying...")
-                time.sleep(wait_time)
-    
-    logger.error(f"Failed to download {url} after {max_retries} attempts")
-    return False
+            export_bundle(FundIndex(args.download_dir), args.output, incremental=args.incremental)
+        except RuntimeError as e:
+            logger.error(f"Export failed: {str(e)}")
+            return 1
+        return 0
+
+    if args.command == "ocr":
+        from ocr_fallback import ocr_downloads
+        stats = ocr_downloads(args.download_dir, workers=args.workers,
+                              max_pages_per_minute=args.max_pages_per_minute, lang=args.lang, dpi=args.dpi)
+        return 1 if stats is None or stats["failed_pages"] else 0
+
+    if args.command == "profile":
+        return 0 if profile_replay(args.archive, args.download_dir, top=args.top, output=args.output) else 1
+
+    if args.record:
+        start_recording(args.record, args.download_dir)
+    elif args.replay and not start_replay(args.replay):
+        return 1
+
+    if args.command == "coordinator":
+        from distributed_crawl import run_coordinator
+        counts = run_coordinator(args.download_dir, args.queue, DOC_TYPES, wait=not args.no_wait,
+                                 poll_seconds=args.poll_seconds, webhook_url=args.webhook)
+        return 1 if counts.get("failed") else 0
+
+    cache = None
+    if args.record or args.replay:
+        # Cached pages never reach the transport, so they would be missing from the archive
+        logger.info("HTTP cache disabled while recording or replaying")
+    elif not args.no_cache:
+        from http_cache import HttpCache
+        cache = HttpCache(args.cache_dir, ttl_seconds=args.cache_ttl_hours * 3600,
+                          max_bytes=args.cache_max_mb * 1024 * 1024, offline=args.offline)
+
+    if args.command == "worker":
+        from distributed_crawl import run_worker
+        run_worker(args.download_dir, args.queue, worker_id=args.worker_id,
+                   visibility_timeout=args.visibility_timeout, min_request_interval=args.min_request_interval,
+                   cache=cache, keep_running=args.keep_running)
+        return 0
+
+    download_sebi_documents(
+        download_dir=args.download_dir,
+        http_only=args.http_only,
+        min_interval_hours=args.min_interval_hours,
+        max_funds_per_driver=args.max_funds_per_driver,
+        max_driver_growth_mb=args.max_driver_growth_mb,
+        cache=cache,
+        budget_minutes=args.budget_minutes,
+        budget_requests=args.budget_requests,
+        webhook_url=args.webhook,
+        download_workers=args.download_workers,
+    )
 
 if __name__ == "__main__":
-    download_sebi_documents()
\ No newline at end of file
+    raise SystemExit(main())
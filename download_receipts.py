@@ -0,0 +1,155 @@
+import os
+import json
+import mmap
+import hashlib
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+RECEIPTS_FILENAME = "receipts.jsonl"
+
+# Hash files in slices this big so a worker never maps a whole large file at once
+HASH_SLICE_BYTES = 8 * 1024 * 1024
+
+_append_lock = threading.Lock()
+
+
+def receipts_path(download_dir):
+    """Path of the receipt log for a download directory."""
+    return os.path.join(download_dir, RECEIPTS_FILENAME)
+
+
+def write_receipt(download_dir, receipt):
+    """Append a receipt to the download directory's receipt log.
+
+    Each receipt is written with a single append so concurrent writers,
+    threads or processes, never interleave lines.
+    """
+    line = (json.dumps(receipt, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+    with _append_lock:
+        fd = os.open(receipts_path(download_dir), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+def load_receipts(download_dir):
+    """Return the latest receipt for every filename in the receipt log."""
+    receipts = {}
+    try:
+        with open(receipts_path(download_dir), "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    receipt = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("Skipping unreadable receipt line")
+                    continue
+                receipts[receipt["filename"]] = receipt
+    except FileNotFoundError:
+        pass
+    return receipts
+
+
+def hash_file(path):
+    """Return (size, sha256 hex digest, starts with %PDF) for a file, reading it through mmap."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0, digest.hexdigest(), False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            is_pdf = mapped[:4] == b"%PDF"
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, HASH_SLICE_BYTES):
+                    digest.update(view[offset:offset + HASH_SLICE_BYTES])
+            finally:
+                view.release()
+    return size, digest.hexdigest(), is_pdf
+
+
+def _hash_job(path):
+    """Process pool wrapper around hash_file that reports errors instead of raising."""
+    try:
+        return path, hash_file(path), None
+    except OSError as e:
+        return path, None, str(e)
+
+
+def audit(download_dir, index=None, workers=None):
+    """Re-verify every PDF in download_dir against its receipt and the fund index.
+
+    Returns a dict with lists of filenames under ``missing`` (receipt but no file),
+    ``corrupt`` (size or hash mismatch, or not a PDF), ``orphaned`` (file that
+    neither a receipt nor the fund index knows), ``stale`` (the fund index now
+    points at a different URL or file than the receipt) and ``unverified``
+    (indexed file without a receipt, e.g. downloaded before receipts existed),
+    plus an ``ok`` count.
+    """
+    receipts = load_receipts(download_dir)
+    on_disk = {}
+    with os.scandir(download_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(".pdf"):
+                on_disk[entry.name] = entry.stat().st_size
+
+    # What the fund index currently expects each file to be
+    current = {}
+    if index is not None:
+        for fund_id, record in index.funds.items():
+            for doc_type, document in record.get("documents", {}).items():
+                if document.get("filename"):
+                    current[document["filename"]] = (fund_id, doc_type)
+
+    report = {"missing": [], "corrupt": [], "orphaned": [], "stale": [], "unverified": [], "ok": 0}
+
+    to_hash = []
+    for filename, receipt in receipts.items():
+        if filename not in on_disk:
+            report["missing"].append(filename)
+        elif on_disk[filename] != receipt.get("size"):
+            # No need to hash a file whose size already disagrees
+            report["corrupt"].append(filename)
+        else:
+            to_hash.append(filename)
+
+        if index is not None and receipt.get("fund_id"):
+            document = index.get_document(receipt["fund_id"], receipt.get("doc_type"))
+            if document and (document.get("filename") != filename
+                             or (document.get("url") and document["url"] != receipt.get("url"))):
+                report["stale"].append(filename)
+
+    for filename in on_disk:
+        if filename in receipts:
+            continue
+        if filename in current:
+            report["unverified"].append(filename)
+        else:
+            report["orphaned"].append(filename)
+
+    paths = [os.path.join(download_dir, filename) for filename in to_hash]
+    if paths:
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(1, len(paths) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path, result, error in pool.map(_hash_job, paths, chunksize=chunksize):
+                filename = os.path.basename(path)
+                if error:
+                    logger.warning(f"Could not read {filename}: {error}")
+                    report["missing"].append(filename)
+                    continue
+                size, sha256, is_pdf = result
+                if sha256 != receipts[filename].get("sha256") or not is_pdf:
+                    report["corrupt"].append(filename)
+                else:
+                    report["ok"] += 1
+
+    for key in ("missing", "corrupt", "orphaned", "stale", "unverified"):
+        report[key].sort()
+    return report
@@ -0,0 +1,333 @@
+import os
+import re
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "fund_index.json"
+
+# How many revision timestamps to keep per document
+MAX_CHANGE_HISTORY = 20
+
+
+def now_iso():
+    """Current UTC time as an ISO 8601 string."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_iso(timestamp):
+    """Parse a timestamp written by now_iso()."""
+    return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+
+# One argument of a JavaScript call and the "," or ")" after it; quoted strings may contain either
+_JS_ARG = re.compile(r"""\s*(?:'((?:[^'\\]|\\.)*)'|"((?:[^"\\]|\\.)*)"|([^,()'"]*))\s*([,)])""")
+
+
+def parse_js_args(script):
+    """Return the arguments of the first call in a javascript: href or onclick, or [].
+
+    Arguments are tokenised before the closing parenthesis is looked for, so
+    quoted names like ``'Fund (Growth)'`` come through whole. A call that does
+    not parse cleanly gives [] rather than a partial argument list.
+    """
+    script = script or ""
+    start = script.find("(")
+    if start < 0:
+        return []
+    if re.match(r"\s*\)", script[start + 1:]):
+        return []
+    args, position = [], start + 1
+    while True:
+        match = _JS_ARG.match(script, position)
+        if not match:
+            return []
+        single, double, bare, terminator = match.groups()
+        quoted = single if single is not None else double
+        args.append(re.sub(r"\\(.)", r"\1", quoted) if quoted is not None else bare.strip())
+        position = match.end()
+        if terminator == ")":
+            return args
+
+
+def normalize_name(name):
+    """Lowercase a fund name and collapse punctuation and whitespace for lookups."""
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", (name or "").lower()).split())
+
+
+def fund_id_for(onclick=None, href=None, pdf_url=None, fund_name=None):
+    """Derive a stable fund id from the getfundDetails(...) arguments, the PDF URL or the name.
+
+    The JavaScript arguments are the site's own identifiers and are preferred,
+    leaving out any that is just the fund's name so a rename keeps the id.
+    The PDF file name is the next most stable thing we see; the normalised
+    display name is only used when neither is available.
+    """
+    name = normalize_name(fund_name)
+    args = [arg for arg in parse_js_args(onclick) or parse_js_args(href)
+            if arg and normalize_name(arg) != name]
+    if args:
+        return "-".join(args)
+    if pdf_url:
+        stem = os.path.splitext(os.path.basename(pdf_url.split("?")[0]))[0]
+        if stem:
+            return f"pdf:{stem}"
+    return f"name:{normalize_name(fund_name)}"
+
+
+def safe_filename_stem(fund_name):
+    """Filename stem for a fund, matching the names of files downloaded before the index existed."""
+    return fund_name.replace(" ", "_").replace("/", "_")
+
+
+class FundIndex:
+    """Persistent map of fund id -> fund record and document filenames.
+
+    Records are kept in ``fund_index.json`` inside the download directory::
+
+        {"funds": {"<fund id>": {"name": ..., "normalized_name": ..., "aliases": [...],
+                                 "detail_urls": {"KIM": ...}, "last_checked": {"KIM": ...},
+                                 "listed": {"KIM": ...},
+                                 "first_seen": ..., "last_seen": ...,
+                                 "documents": {"KIM": {"filename": ..., "url": ..., "size": ...,
+                                                       "sha256": ..., "downloaded_at": ...,
+                                                       "changes": [...], "removed_at": ...}}}}}
+
+    A normalised-name table is rebuilt on load so callers can resolve a display
+    name to fund ids, and every existence check is a dictionary lookup. Run-level
+    facts such as when the last full crawl finished live under ``"meta"``.
+
+    Callbacks registered with add_listener receive an event dict whenever a
+    document is new, updated (different hash) or removed from the listings.
+    """
+
+    def __init__(self, download_dir):
+        self.download_dir = download_dir
+        self.path = os.path.join(download_dir, INDEX_FILENAME)
+        self.funds = {}
+        self.meta = {}
+        self.names = {}
+        self._claimed = {}
+        self._untracked = set()
+        self._listeners = []
+        self._lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        """Read the index from disk and note PDFs that no fund has claimed yet."""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.funds = data.get("funds", {})
+            self.meta = data.get("meta", {})
+        except FileNotFoundError:
+            self.funds, self.meta = {}, {}
+        except json.JSONDecodeError:
+            logger.warning(f"Fund index {self.path} is corrupt, starting a new one")
+            self.funds, self.meta = {}, {}
+
+        self.names = {}
+        self._claimed = {}
+        for fund_id, record in self.funds.items():
+            for name in [record.get("normalized_name")] + record.get("aliases", []):
+                if name:
+                    self.names.setdefault(name, [])
+                    if fund_id not in self.names[name]:
+                        self.names[name].append(fund_id)
+            for doc_type, document in record.get("documents", {}).items():
+                if document.get("filename"):
+                    self._claimed[document["filename"]] = (fund_id, doc_type)
+
+        # Files downloaded before the index existed can be adopted by the fund they belong to
+        self._untracked = set()
+        if os.path.isdir(self.download_dir):
+            with os.scandir(self.download_dir) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith(".pdf") and entry.name not in self._claimed:
+                        self._untracked.add(entry.name)
+
+    def save(self):
+        """Write the index atomically."""
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"funds": self.funds, "meta": self.meta}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def register_fund(self, fund_id, fund_name, doc_type=None, detail_url=None):
+        """Add or refresh a fund record, noting the details page it was seen on for doc_type."""
+        with self._lock:
+            normalized = normalize_name(fund_name)
+            record = self.funds.get(fund_id)
+            if record is None:
+                record = {
+                    "name": fund_name,
+                    "normalized_name": normalized,
+                    "aliases": [],
+                    "first_seen": now_iso(),
+                    "documents": {},
+                }
+                self.funds[fund_id] = record
+            elif normalized and normalized != record.get("normalized_name"):
+                # Keep the old name as an alias so lookups by either name still work
+                logger.info(f"Fund {fund_id} renamed: {record.get('name')} -> {fund_name}")
+                if record.get("normalized_name") and record["normalized_name"] not in record["aliases"]:
+                    record["aliases"].append(record["normalized_name"])
+                record["name"] = fund_name
+                record["normalized_name"] = normalized
+
+            record["last_seen"] = now_iso()
+            if doc_type:
+                record.setdefault("listed", {})[doc_type] = record["last_seen"]
+                document = record.get("documents", {}).get(doc_type)
+                if document and document.pop("removed_at", None):
+                    logger.info(f"Fund {fund_id} {doc_type} is listed again")
+                    self._emit("new", fund_id, doc_type, {}, document)
+            if doc_type and detail_url:
+                record.setdefault("detail_urls", {})[doc_type] = detail_url
+            if normalized:
+                self.names.setdefault(normalized, [])
+                if fund_id not in self.names[normalized]:
+                    self.names[normalized].append(fund_id)
+            return record
+
+    def lookup_name(self, fund_name):
+        """Return the ids of funds that have ever been listed under this name."""
+        return list(self.names.get(normalize_name(fund_name), []))
+
+    def get_document(self, fund_id, doc_type):
+        """Return the document record for a fund, or None."""
+        return self.funds.get(fund_id, {}).get("documents", {}).get(doc_type)
+
+    def has_document(self, fund_id, doc_type):
+        """True if the fund's document of this type has been downloaded."""
+        return self.get_document(fund_id, doc_type) is not None
+
+    def document_filename(self, fund_id, doc_type):
+        """Return the filename for a fund's document, assigning a unique one on first use.
+
+        The first fund to use a display name gets the historic ``<name>_<DOC>.pdf``;
+        any other fund with the same name gets its id appended. An existing file
+        with the assigned name that no fund has claimed is adopted as already
+        downloaded.
+        """
+        with self._lock:
+            document = self.get_document(fund_id, doc_type)
+            if document and document.get("filename"):
+                return document["filename"]
+
+            record = self.funds[fund_id]
+            stem = safe_filename_stem(record["name"]) or re.sub(r"[^0-9A-Za-z]+", "_", fund_id)
+            filename = f"{stem}_{doc_type}.pdf"
+            if filename in self._claimed and self._claimed[filename] != (fund_id, doc_type):
+                suffix = re.sub(r"[^0-9A-Za-z]+", "_", fund_id).strip("_")
+                filename = f"{stem}_{suffix}_{doc_type}.pdf"
+
+            if filename in self._untracked:
+                logger.info(f"Adopting existing file {filename} for fund {fund_id}")
+                self._untracked.discard(filename)
+                self.record_document(fund_id, doc_type, filename, downloaded_at=None)
+            else:
+                self._claimed[filename] = (fund_id, doc_type)
+            return filename
+
+    def record_document(self, fund_id, doc_type, filename, url=None, downloaded_at="", receipt=None):
+        """Mark a fund's document as downloaded to filename, keeping its size and hash from the receipt."""
+        with self._lock:
+            documents = self.funds[fund_id].setdefault("documents", {})
+            document = documents.setdefault(doc_type, {})
+            previous = dict(document)
+            # A different URL or hash for a document we already had is a revision
+            if ((url and document.get("url") and url != document["url"])
+                    or (receipt and document.get("sha256") and receipt["sha256"] != document["sha256"])):
+                document["changes"] = (document.get("changes", []) + [now_iso()])[-MAX_CHANGE_HISTORY:]
+            document["filename"] = filename
+            if url:
+                document["url"] = url
+            document["downloaded_at"] = now_iso() if downloaded_at == "" else downloaded_at
+            if receipt:
+                document["size"] = receipt["size"]
+                document["sha256"] = receipt["sha256"]
+            self._claimed[filename] = (fund_id, doc_type)
+
+            # Only downloads are reported; adopting an old file changes nothing upstream
+            if receipt:
+                if not (previous.get("sha256") or previous.get("url")):
+                    self._emit("new", fund_id, doc_type, previous, document)
+                elif previous.get("sha256"):
+                    if previous["sha256"] != receipt["sha256"]:
+                        self._emit("updated", fund_id, doc_type, previous, document)
+                elif previous.get("url") != document.get("url"):
+                    # An adopted file has no hash to compare, only the URL it came from
+                    self._emit("updated", fund_id, doc_type, previous, document)
+            return document
+
+    def retire_unlisted(self, since, doc_types, max_fraction=None):
+        """Mark documents whose fund was not listed under their type since ``since`` as removed.
+
+        Call this after a complete crawl of the listings that began at ``since``.
+        With ``max_fraction``, a doc type is left alone if more than that share of
+        its documents would go at once, since a listing the crawler misread looks
+        just like a mass withdrawal. Returns how many documents were retired.
+        """
+        retired = 0
+        with self._lock:
+            for doc_type in doc_types:
+                active, unlisted = 0, []
+                for fund_id, record in self.funds.items():
+                    document = record.get("documents", {}).get(doc_type)
+                    if not document or document.get("removed_at"):
+                        continue
+                    active += 1
+                    listed = record.get("listed", {}).get(doc_type) or record.get("last_seen")
+                    if listed and parse_iso(listed) < since:
+                        unlisted.append((fund_id, document))
+                if max_fraction is not None and len(unlisted) > active * max_fraction:
+                    logger.warning(f"Not retiring {len(unlisted)} of {active} {doc_type} documents: "
+                                   f"more than {max_fraction:.0%} of them were not listed")
+                    continue
+                for fund_id, document in unlisted:
+                    document["removed_at"] = now_iso()
+                    self._emit("removed", fund_id, doc_type, document, {})
+                    retired += 1
+        return retired
+
+    def add_listener(self, callback):
+        """Call callback(event) for every document change from now on."""
+        self._listeners.append(callback)
+
+    def _emit(self, kind, fund_id, doc_type, old, new):
+        if not self._listeners:
+            return
+        event = {
+            "at": now_iso(),
+            "event": kind,
+            "fund_id": fund_id,
+            "doc_type": doc_type,
+            "name": self.funds[fund_id].get("name"),
+            "filename": new.get("filename") or old.get("filename"),
+            "url": new.get("url") or old.get("url"),
+            "old_url": old.get("url"),
+            "old_sha256": old.get("sha256"),
+            "new_sha256": new.get("sha256"),
+            "old_size": old.get("size"),
+            "new_size": new.get("size"),
+        }
+        for callback in self._listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.warning(f"Change listener failed: {str(e)}")
+
+    def mark_checked(self, fund_id, doc_type):
+        """Note that a fund's details page for doc_type was just checked."""
+        with self._lock:
+            self.funds[fund_id].setdefault("last_checked", {})[doc_type] = now_iso()
+
+    def record_download(self, fund_id, doc_type, receipt):
+        """Record a finished download from its receipt and save the index."""
+        self.record_document(fund_id, doc_type, receipt["filename"], url=receipt["url"], receipt=receipt)
+        self.save()
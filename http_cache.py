@@ -0,0 +1,127 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".http_cache"
+DEFAULT_TTL_SECONDS = 6 * 3600
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+class CacheMiss(Exception):
+    """Raised for a page that is not cached while the cache is offline."""
+
+
+def cache_key(method, url, data=None):
+    """Key for a request: method, URL and sorted form parameters."""
+    params = urlencode(sorted((data or {}).items()))
+    return hashlib.sha256(f"{method.upper()} {url}\n{params}".encode("utf-8")).hexdigest()
+
+
+class HttpCache:
+    """Gzip-compressed on-disk cache for HTML pages (never PDFs).
+
+    Each entry is one ``<key>.gz`` file whose first line is a JSON header
+    (URL, method, form data, encoding, fetch time) followed by the body.
+    Entries expire after ``ttl_seconds``; once the cache grows past
+    ``max_bytes`` the least recently used files are removed. A hit refreshes
+    the file's mtime, which is what LRU order is based on.
+
+    An ``offline`` cache serves entries regardless of age and never lets a
+    request reach the network, so parsing can be iterated on without a
+    connection.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self):
+        with os.scandir(self.cache_dir) as entries:
+            return [entry for entry in entries if entry.name.endswith(".gz")]
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.gz")
+
+    def get(self, method, url, data=None):
+        """Return the cached body text for a request, or None if absent or expired."""
+        path = self._path(cache_key(method, url, data))
+        try:
+            with gzip.open(path, "rb") as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except (FileNotFoundError, OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if not self.offline and time.time() - header["fetched_at"] > self.ttl_seconds:
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return body.decode(header.get("encoding") or "utf-8", errors="replace")
+
+    def put(self, method, url, text, data=None, encoding="utf-8"):
+        """Store a page body and evict old entries if the cache is over its size limit."""
+        path = self._path(cache_key(method, url, data))
+        header = {"method": method.upper(), "url": url, "data": data or {}, "encoding": encoding,
+                  "fetched_at": time.time()}
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            f.write(text.encode(encoding, errors="replace"))
+
+        with self._lock:
+            try:
+                self._total_bytes -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmp_path, path)
+            self._total_bytes += os.path.getsize(path)
+            if self.max_bytes and self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is 90% of its limit."""
+        target = self.max_bytes * 0.9
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        removed = 0
+        for entry in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self._total_bytes -= size
+            removed += 1
+        logger.info(f"HTTP cache evicted {removed} entries")
+
+    def clear(self):
+        """Remove every cached entry."""
+        with self._lock:
+            for entry in self._entries():
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+            self._total_bytes = 0
@@ -0,0 +1,245 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+OCR_DIRNAME = "ocr"
+OCR_CACHE_DIRNAME = ".ocr_cache"
+# Which PDF versions are fully done, so unchanged ones are not even opened again
+OCR_STATE_FILENAME = "state.json"
+
+# A text object in a content stream starts with the BT operator
+_TEXT_OPERATOR = re.compile(rb"(?:^|[\s\]>)])BT(?:[\s\[<(/]|$)")
+
+
+def _stream_bytes(obj):
+    """Raw (still encoded) bytes of a stream object; cheaper than decoding for hashing."""
+    data = getattr(obj, "_data", None)
+    return data if data is not None else obj.get_data()
+
+
+def _inspect_resources(resources, digest, seen):
+    """Walk XObjects, hashing images and returning (has_text, has_image)."""
+    has_text = has_image = False
+    xobjects = resources.get("/XObject") if resources else None
+    if not xobjects:
+        return has_text, has_image
+    for name in xobjects:
+        xobject = xobjects[name].get_object()
+        if id(xobject) in seen:
+            continue
+        seen.add(id(xobject))
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            has_image = True
+            digest.update(_stream_bytes(xobject))
+        elif subtype == "/Form":
+            data = xobject.get_data()
+            digest.update(data)
+            has_text = has_text or bool(_TEXT_OPERATOR.search(data))
+            form_text, form_image = _inspect_resources(xobject.get("/Resources"), digest, seen)
+            has_text, has_image = has_text or form_text, has_image or form_image
+    return has_text, has_image
+
+
+def scan_pdf(path):
+    """Return [(page_number, page_hash)] for pages that carry images but no text objects.
+
+    Only content streams and resource dictionaries are inspected; nothing is
+    rendered. The page hash covers the content stream and the raw image data,
+    so an identical scanned page in another file hashes the same.
+    """
+    from pypdf import PdfReader
+
+    image_pages = []
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        digest = hashlib.sha256()
+        contents = page.get_contents()
+        data = contents.get_data() if contents is not None else b""
+        digest.update(data)
+        has_text, has_image = _inspect_resources(page.get("/Resources"), digest, set())
+        if not has_text and not _TEXT_OPERATOR.search(data) and has_image:
+            image_pages.append((number, digest.hexdigest()))
+    return image_pages
+
+
+def _scan_job(path):
+    try:
+        return path, scan_pdf(path), None
+    except Exception as e:
+        return path, [], str(e)
+
+
+def _page_key(page_hash, lang, dpi):
+    """Cache key for a page's text; the same page OCR'd with other settings is a different entry."""
+    return f"{page_hash}-{lang}-{dpi}"
+
+
+def _ocr_job(path, page_number, page_key, cache_dir, dpi, lang):
+    """Render one page and OCR it, caching the text under the page key."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        image_prefix = os.path.join(work_dir, "page")
+        subprocess.run(
+            ["pdftoppm", "-f", str(page_number), "-l", str(page_number), "-r", str(dpi), "-gray",
+             "-png", "-singlefile", path, image_prefix],
+            check=True, capture_output=True,
+        )
+        result = subprocess.run(
+            ["tesseract", image_prefix + ".png", "stdout", "-l", lang],
+            check=True, capture_output=True,
+        )
+    text = result.stdout.decode("utf-8", errors="replace")
+    cache_path = os.path.join(cache_dir, f"{page_key}.txt")
+    with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(cache_path + ".tmp", cache_path)
+    return page_key
+
+
+def _lower_priority():
+    """Run OCR workers at low CPU priority so downloads on the same host are not starved."""
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+
+def _pdf_version(entry):
+    stat = entry.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load_state(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_state(path, state):
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def ocr_downloads(download_dir, workers=None, max_pages_per_minute=None, lang="eng", dpi=300):
+    """OCR the image-only pages of every PDF in download_dir.
+
+    Each PDF with scanned pages gets ``ocr/<name>.txt`` holding the text of
+    those pages, written only once every one of them has been OCR'd. Page text
+    is cached in ``.ocr_cache/<page hash>-<lang>-<dpi>.txt``, so a page is only
+    OCR'd once per language and resolution; pages that failed are retried on
+    the next run. ``ocr/state.json`` remembers which PDF versions are done, and
+    with which settings, including those with no scanned pages. Work runs in a process pool of ``workers`` (default: a quarter of
+    the CPUs) at lowered priority, with at most two pages in flight per worker
+    and optionally no more than ``max_pages_per_minute`` pages started per
+    minute.
+    """
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        logger.error("OCR needs pypdf: pip install pypdf")
+        return None
+    missing = [tool for tool in ("pdftoppm", "tesseract") if shutil.which(tool) is None]
+    if missing:
+        logger.error(f"OCR needs {', '.join(missing)} on PATH (poppler-utils and tesseract-ocr)")
+        return None
+
+    output_dir = os.path.join(download_dir, OCR_DIRNAME)
+    cache_dir = os.path.join(download_dir, OCR_CACHE_DIRNAME)
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = {name[:-4] for name in os.listdir(cache_dir) if name.endswith(".txt")}
+    state_path = os.path.join(output_dir, OCR_STATE_FILENAME)
+    state = _load_state(state_path)
+
+    pdfs, versions = [], {}
+    with os.scandir(download_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(".pdf"):
+                versions[entry.name] = _pdf_version(entry) + [lang, dpi]
+                if state.get(entry.name) != versions[entry.name]:
+                    pdfs.append(entry.path)
+    pdfs.sort()
+    # Forget PDFs that are gone
+    state = {name: version for name, version in state.items() if name in versions}
+
+    workers = workers or max(1, (os.cpu_count() or 1) // 4)
+    stats = {"pdfs": len(pdfs), "scanned_pdfs": 0, "image_pages": 0, "ocr_pages": 0, "failed_pages": 0}
+    min_gap = 60.0 / max_pages_per_minute if max_pages_per_minute else 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_lower_priority) as pool:
+        # Find image-only pages without rendering anything
+        documents = []
+        for path, pages, error in pool.map(_scan_job, pdfs, chunksize=max(1, len(pdfs) // (workers * 4))):
+            if error:
+                logger.warning(f"Could not read {os.path.basename(path)}: {error}")
+                continue
+            documents.append((path, pages))
+            if pages:
+                stats["scanned_pdfs"] += 1
+                stats["image_pages"] += len(pages)
+
+        # OCR each distinct uncached page once, keeping the pool's queue short
+        jobs = {}
+        for path, pages in documents:
+            for page_number, page_hash in pages:
+                key = _page_key(page_hash, lang, dpi)
+                if key not in cached and key not in jobs:
+                    jobs[key] = (path, page_number)
+
+        in_flight = set()
+        last_start = 0.0
+        for key, (path, page_number) in jobs.items():
+            while len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                stats = _collect(done, cached, stats)
+            if min_gap:
+                time.sleep(max(0.0, last_start + min_gap - time.monotonic()))
+                last_start = time.monotonic()
+            in_flight.add(pool.submit(_ocr_job, path, page_number, key, cache_dir, dpi, lang))
+        stats = _collect(wait(in_flight).done, cached, stats)
+
+    # Assemble per-document text from the page cache, leaving incomplete PDFs for the next run
+    for path, pages in documents:
+        name = os.path.basename(path)
+        output_path = os.path.join(output_dir, os.path.splitext(name)[0] + ".txt")
+        if not pages:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+        elif any(_page_key(page_hash, lang, dpi) not in cached for _, page_hash in pages):
+            continue
+        else:
+            with open(output_path + ".tmp", "w", encoding="utf-8") as out:
+                for page_number, page_hash in pages:
+                    with open(os.path.join(cache_dir, f"{_page_key(page_hash, lang, dpi)}.txt"), "r",
+                              encoding="utf-8") as f:
+                        out.write(f"--- page {page_number} ---\n{f.read()}\n")
+            os.replace(output_path + ".tmp", output_path)
+        state[name] = versions[name]
+    _save_state(state_path, state)
+
+    logger.info(f"OCR: {stats['pdfs']} PDFs checked, {stats['scanned_pdfs']} with scanned pages, "
+                f"{stats['image_pages']} image-only pages, {stats['ocr_pages']} newly OCR'd, "
+                f"{stats['failed_pages']} failed")
+    return stats
+
+
+def _collect(futures, cached, stats):
+    for future in futures:
+        try:
+            cached.add(future.result())
+            stats["ocr_pages"] += 1
+        except Exception as e:
+            logger.warning(f"OCR of a page failed: {str(e)}")
+            stats["failed_pages"] += 1
+    return stats
@@ -0,0 +1,276 @@
+import os
+import re
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import uuid
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from download_receipts import write_receipt
+from http_cache import CacheMiss
+from fund_index import now_iso
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+def http_session():
+    """Return the requests session every fetch and download goes through."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(HEADERS)
+        return _session
+
+def install_adapter(adapter):
+    """Send every HTTP(S) request through adapter, e.g. to record or replay a run."""
+    session = http_session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+def pdf_url_from_viewer_src(src):
+    """Return the PDF URL from a details page viewer iframe src, or None."""
+    if not src or "file=" not in src:
+        return None
+    return src.split("file=")[1].split("&")[0]
+
+def find_pdf_url(html):
+    """Return the PDF URL of the viewer iframe in a fund details page, or None."""
+    for match in re.finditer(r"<iframe[^>]*\ssrc=[\"']([^\"']*\.pdf[^\"']*)[\"']", html, re.IGNORECASE):
+        pdf_url = pdf_url_from_viewer_src(match.group(1))
+        if pdf_url:
+            return pdf_url
+    return None
+
+def fetch_page(url, data=None, cache=None, timeout=30, before_request=None):
+    """Fetch an HTML page, POSTing data as a form if given, and return its text.
+
+    With an HttpCache, fresh cached copies are served without touching the
+    network, and an offline cache raises CacheMiss instead of fetching.
+    before_request() is called only when the page really goes to the network.
+    """
+    method = "POST" if data else "GET"
+    if cache is not None:
+        text = cache.get(method, url, data)
+        if text is not None:
+            return text
+        if cache.offline:
+            raise CacheMiss(f"{method} {url} is not cached")
+
+    if before_request is not None:
+        before_request()
+    response = http_session().request(method, url, data=data, timeout=timeout)
+    response.raise_for_status()
+    if cache is not None:
+        cache.put(method, url, response.text, data=data, encoding=response.encoding or "utf-8")
+    return response.text
+
+def part_path(filepath):
+    """Temporary name to write filepath under, unique to this process and thread.
+
+    Two writers of the same file (say a worker whose lease expired and the one
+    that took the task over) each get their own, so neither can corrupt the other.
+    """
+    return f"{filepath}.{os.getpid()}.{threading.get_ident()}.{uuid.uuid4().hex[:8]}.part"
+
+def download_pdf(url, filename, download_dir, max_retries=3, fund_id=None, doc_type=None):
+    """Download PDF directly using requests with retry mechanism.
+
+    On success a receipt is appended to the download directory's receipt log
+    and returned; on failure False is returned.
+    """
+    filepath = os.path.join(download_dir, filename)
+    
+    for attempt in range(max_retries):
+        temp_path = None
+        try:
+            started_at = now_iso()
+            logger.info(f"Download attempt {attempt+1}/{max_retries} for {filename}")
+            response = http_session().get(url, stream=True, timeout=30)
+            response.raise_for_status()
+            
+            # Write to a temporary name so a partial file is never mistaken for a download
+            temp_path = part_path(filepath)
+            digest = hashlib.sha256()
+            size = 0
+            with open(temp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=8192):
+                    if chunk:
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            os.replace(temp_path, filepath)
+            
+            receipt = {
+                "filename": filename,
+                "url": url,
+                "fund_id": fund_id,
+                "doc_type": doc_type,
+                "size": size,
+                "sha256": digest.hexdigest(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "started_at": started_at,
+                "finished_at": now_iso(),
+            }
+            write_receipt(download_dir, receipt)
+            logger.info(f"Downloaded: {filename} ({size} bytes)")
+            return receipt
+        except Exception as e:
+            logger.warning(f"Attempt {attempt+1} failed to download {url}: {str(e)}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            if attempt < max_retries - 1:
+                wait_time = 2 * (attempt + 1)  # Exponential backoff
+                logger.info(f"Waiting {wait_time} seconds before retrying...")
+                time.sleep(wait_time)
+    
+    logger.error(f"Failed to download {url} after {max_retries} attempts")
+    return False
+
+def copy_download(receipt, filename, download_dir, fund_id=None, doc_type=None):
+    """Give another fund its own file for a PDF that was just downloaded, with its own receipt.
+
+    The copy is a hard link where the filesystem allows it, so a shared
+    document costs no extra space until one of the funds' files is replaced.
+    """
+    source = os.path.join(download_dir, receipt["filename"])
+    target = os.path.join(download_dir, filename)
+    temp_path = part_path(target)
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, target)
+
+    copied = dict(receipt, filename=filename, fund_id=fund_id, doc_type=doc_type, finished_at=now_iso())
+    write_receipt(download_dir, copied)
+    logger.info(f"Copied {receipt['filename']} to {filename}")
+    return copied
+
+class DownloadPool:
+    """Run download_pdf() on a small thread pool, fetching each URL at most once at a time.
+
+    Every PDF the crawler finds goes through submit(). A URL that is already
+    being downloaded is not fetched again. A later caller that wants it under
+    a different filename gets its own copy once the download lands, so every
+    fund always ends up with its own file and receipt, however the downloads
+    happen to overlap.
+    """
+
+    def __init__(self, max_workers=4):
+        # With no workers, downloads run inline in submit(), which keeps profiles single-threaded
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdf") if max_workers else None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._cancelling = False
+        self.stats = {"submitted": 0, "deduplicated": 0, "downloaded": 0, "failed": 0, "cancelled": 0,
+                      "bytes": 0, "seconds": 0.0}
+
+    def submit(self, url, filename, download_dir, fund_id=None, doc_type=None, on_success=None):
+        """Queue a download and return its future; on_success(receipt) runs when it succeeds."""
+        with self._lock:
+            future, in_flight_filename = self._in_flight.get(url, (None, None))
+            is_new = future is None
+            if is_new:
+                future = Future()
+                self._in_flight[url] = (future, filename)
+                self.stats["submitted"] += 1
+            else:
+                self.stats["deduplicated"] += 1
+                logger.info(f"Already downloading {url} - not queueing it again")
+
+        if not is_new and in_flight_filename != filename:
+            copy = Future()
+            copy.set_running_or_notify_cancel()
+            future.add_done_callback(
+                lambda done: self._copy(done, copy, filename, download_dir, fund_id, doc_type)
+            )
+            future = copy
+
+        if is_new:
+            future.set_running_or_notify_cancel()
+            if self._executor is None:
+                self._resolve(future, url, filename, download_dir, fund_id, doc_type)
+            else:
+                self._executor.submit(self._resolve, future, url, filename, download_dir, fund_id, doc_type)
+
+        if on_success is not None:
+            future.add_done_callback(lambda done: self._notify(done, on_success))
+        return future
+
+    def _copy(self, download, future, filename, download_dir, fund_id, doc_type):
+        try:
+            receipt = download.result()
+            future.set_result(copy_download(receipt, filename, download_dir, fund_id, doc_type) if receipt else False)
+        except Exception as e:
+            future.set_exception(e)
+
+    def _resolve(self, future, *args):
+        if self._cancelling:
+            # close() ran out of time before this download started
+            with self._lock:
+                self._in_flight.pop(args[0], None)
+                self.stats["cancelled"] += 1
+            future.set_result(False)
+            return
+        try:
+            future.set_result(self._run(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _run(self, url, filename, download_dir, fund_id, doc_type):
+        started = time.monotonic()
+        receipt = False
+        try:
+            receipt = download_pdf(url, filename, download_dir, fund_id=fund_id, doc_type=doc_type)
+            return receipt
+        finally:
+            with self._lock:
+                self._in_flight.pop(url, None)
+                self.stats["seconds"] += time.monotonic() - started
+                if receipt:
+                    self.stats["downloaded"] += 1
+                    self.stats["bytes"] += receipt["size"]
+                else:
+                    self.stats["failed"] += 1
+
+    def _notify(self, future, on_success):
+        try:
+            receipt = future.result()
+            if receipt:
+                on_success(receipt)
+        except Exception as e:
+            logger.error(f"Error recording download: {str(e)}")
+
+    def close(self, timeout=None):
+        """Wait for queued downloads to finish and log what the pool did.
+
+        With a timeout, downloads that have not started when it runs out are
+        cancelled; ones already running are allowed to finish.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._executor is not None:
+            if timeout is not None:
+                with self._lock:
+                    pending = [future for future, _ in self._in_flight.values()]
+                if wait(pending, timeout=max(timeout, 0)).not_done:
+                    logger.info("Out of time - cancelling downloads that have not started")
+                    self._cancelling = True
+            self._executor.shutdown(wait=True)
+        stats = self.stats
+        logger.info(f"Downloads: {stats['downloaded']} done, {stats['failed']} failed, {stats['cancelled']} cancelled, "
+                    f"{stats['deduplicated']} duplicates skipped, {stats['bytes'] / (1024 * 1024):.1f} MB "
+                    f"in {stats['seconds']:.1f} s of download time")
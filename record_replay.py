@@ -0,0 +1,213 @@
+import io
+import os
+import re
+import gzip
+import json
+import uuid
+import logging
+import threading
+from urllib.parse import parse_qsl
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from fund_index import now_iso
+from http_cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+# Headers that describe the wire encoding, which no longer applies to the stored body
+_TRANSPORT_HEADERS = ("content-encoding", "transfer-encoding", "content-length")
+
+# Built-ins whose own time is spent waiting on the OS rather than running Python
+_IO_FUNCTIONS = {
+    "sleep", "read", "read1", "readinto", "readline", "readlines", "recv", "recv_into", "recvfrom", "send",
+    "sendall", "sendfile", "write", "writelines", "select", "poll", "epoll", "acquire", "wait", "connect",
+    "connect_ex", "getaddrinfo", "do_handshake", "open", "close", "fsync", "flush", "replace", "rename",
+    "stat", "lstat", "fstat", "scandir", "listdir", "mmap", "urlopen",
+}
+
+# "<method 'read' of '_io.BufferedReader' objects>" or "<built-in method time.sleep>"
+_BUILTIN_NAME = re.compile(r"<method '([^']+)'|<built-in method (?:[\w.]+\.)?(\w+)>|<built-in function (\w+)>")
+
+
+def builtin_name(description):
+    """The bare function or method name in a cProfile description of a built-in."""
+    match = _BUILTIN_NAME.search(description)
+    if match is None:
+        return description
+    return next(group for group in match.groups() if group)
+
+OUR_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def request_key(request):
+    """Archive key for a prepared request: method, URL and form body, as the HTTP cache keys pages."""
+    body = request.body
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    data = dict(parse_qsl(body)) if body else None
+    return cache_key(request.method, request.url, data)
+
+
+def index_snapshot_path(archive_path):
+    """Where the fund index is copied when a recording starts."""
+    return archive_path + ".fund_index.json"
+
+
+class WarcWriter:
+    """Append WARC/1.0 response records to a .warc.gz file, one gzip member per record.
+
+    A sidecar ``.idx`` file maps each request key to its member's offset and
+    length, so replay can decompress single records without scanning the archive.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+        self._lock = threading.Lock()
+
+    def write_response(self, key, method, url, status, reason, headers, body):
+        http_head = f"HTTP/1.1 {status} {reason or ''}\r\n"
+        http_head += "".join(f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+        block = http_head.encode("latin-1", errors="replace") + body
+        warc_head = (
+            "WARC/1.0\r\n"
+            "WARC-Type: response\r\n"
+            f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n"
+            f"WARC-Date: {now_iso()}\r\n"
+            f"WARC-Target-URI: {url}\r\n"
+            f"WARC-Request-Method: {method}\r\n"
+            f"WARC-Request-Key: {key}\r\n"
+            "Content-Type: application/http; msgtype=response\r\n"
+            f"Content-Length: {len(block)}\r\n"
+            "\r\n"
+        )
+        member = gzip.compress(warc_head.encode("utf-8") + block + b"\r\n\r\n")
+
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.seek(0, os.SEEK_END)
+                offset = f.tell()
+                f.write(member)
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps({"key": key, "url": url, "offset": offset, "length": len(member)}) + "\n")
+
+
+class WarcArchive:
+    """Random access to the records of an archive written by WarcWriter."""
+
+    def __init__(self, path):
+        self.path = path
+        self._records = {}
+        with open(path + ".idx", "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._records[entry["key"]] = (entry["offset"], entry["length"])
+        self._file = open(path, "rb")
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, key):
+        """Return (status, reason, headers, body) for a request key, or None."""
+        location = self._records.get(key)
+        if location is None:
+            return None
+        offset, length = location
+        with self._lock:
+            self._file.seek(offset)
+            data = gzip.decompress(self._file.read(length))
+
+        warc_end = data.index(b"\r\n\r\n")
+        warc_headers = dict(
+            line.split(": ", 1) for line in data[:warc_end].decode("utf-8").split("\r\n")[1:]
+        )
+        block = data[warc_end + 4:warc_end + 4 + int(warc_headers["Content-Length"])]
+        http_end = block.index(b"\r\n\r\n")
+        lines = block[:http_end].decode("latin-1").split("\r\n")
+        _, status, reason = (lines[0].split(" ", 2) + [""])[:3]
+        headers = CaseInsensitiveDict(line.split(": ", 1) for line in lines[1:])
+        return int(status), reason, headers, block[http_end + 4:]
+
+    def close(self):
+        self._file.close()
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Transport adapter that sends requests normally and archives every response."""
+
+    def __init__(self, writer, **kwargs):
+        super().__init__(**kwargs)
+        self.writer = writer
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        # Reading the body here leaves it cached on the response for the caller
+        body = response.content
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in _TRANSPORT_HEADERS}
+        headers["Content-Length"] = str(len(body))
+        self.writer.write_response(request_key(request), request.method, request.url,
+                                   response.status_code, response.reason, headers, body)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter that answers requests from a WarcArchive and never touches the network."""
+
+    def __init__(self, archive):
+        super().__init__()
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        record = self.archive.get(request_key(request))
+        if record is None:
+            raise requests.exceptions.ConnectionError(
+                f"{request.method} {request.url} is not in the replay archive", request=request
+            )
+        status, reason, headers, body = record
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.headers = headers
+        response.url = request.url
+        response.request = request
+        response.encoding = get_encoding_from_headers(headers)
+        response.raw = io.BytesIO(body)
+        response._content = body
+        response._content_consumed = True
+        return response
+
+    def close(self):
+        self.archive.close()
+
+
+def report_profile(stats, top=25):
+    """Log where a profiled run spent its time: our functions, OS/I/O waits, and everything else."""
+    ours, io_wait, other = [], [], []
+    for (filename, lineno, function), (_, calls, self_time, cumulative, _) in stats.stats.items():
+        entry = (self_time, cumulative, calls, f"{os.path.basename(filename)}:{lineno}({function})")
+        if filename == "~":
+            # Built-in functions: the ones that block on the OS count as I/O
+            (io_wait if builtin_name(function) in _IO_FUNCTIONS else other).append(entry)
+        elif os.path.abspath(filename).startswith(OUR_DIR) and "site-packages" not in filename:
+            ours.append(entry)
+        else:
+            other.append(entry)
+
+    total = stats.total_tt or 1e-9
+    for label, entries in (("our code", ours), ("I/O and waiting", io_wait), ("libraries and interpreter", other)):
+        seconds = sum(entry[0] for entry in entries)
+        logger.info(f"{label}: {seconds:.3f} s ({100 * seconds / total:.1f}%)")
+
+    logger.info("Hot spots in our code (self time / cumulative / calls):")
+    for self_time, cumulative, calls, name in sorted(ours, reverse=True)[:top]:
+        logger.info(f"  {self_time:8.3f} {cumulative:8.3f} {calls:8d}  {name}")
+    logger.info("Top I/O waits (self time / calls):")
+    for self_time, _, calls, name in sorted(io_wait, reverse=True)[:top]:
+        logger.info(f"  {self_time:8.3f} {calls:8d}  {name}")
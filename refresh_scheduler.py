@@ -0,0 +1,97 @@
+import re
+import math
+import time
+import logging
+from datetime import datetime, timezone
+
+from fund_index import parse_iso
+
+logger = logging.getLogger(__name__)
+
+# Closed-ended schemes stop revising their documents once they mature
+CLOSED_ENDED_PATTERN = re.compile(
+    r"fixed term|fixed maturity|\bfmp\b|capital protection|dual advantage|interval fund|\bseries\b",
+    re.IGNORECASE,
+)
+
+# Prior belief about how often a document changes: one revision every PRIOR_DAYS days
+PRIOR_DAYS = 90.0
+
+# How strongly to discount closed-ended schemes that have been quiet this long
+CLOSED_ENDED_QUIET_DAYS = 180
+CLOSED_ENDED_FACTOR = 0.05
+
+
+def _days_between(earlier, later):
+    return max((later - earlier).total_seconds() / 86400, 0.0)
+
+
+def change_probability(record, doc_type, now=None):
+    """Estimate the chance that a fund's document changed since it was last checked.
+
+    Documents never fetched score 1.0 so newly listed funds go first. Otherwise
+    the observed revision count over the time we've tracked the fund, smoothed
+    towards one revision per PRIOR_DAYS, gives a rate, and the probability of
+    at least one revision since the last check follows from a Poisson model.
+    """
+    now = now or datetime.now(timezone.utc)
+    document = record.get("documents", {}).get(doc_type)
+    if not document or not document.get("url"):
+        return 1.0
+
+    changes = [parse_iso(ts) for ts in document.get("changes", [])]
+    first_seen = parse_iso(record["first_seen"]) if record.get("first_seen") else now
+    last_checked = (record.get("last_checked", {}).get(doc_type) or document.get("downloaded_at")
+                    or record.get("first_seen"))
+    last_checked = parse_iso(last_checked) if last_checked else first_seen
+
+    rate = (len(changes) + 1) / (_days_between(first_seen, now) + PRIOR_DAYS)
+    last_change = max(changes) if changes else first_seen
+    if (CLOSED_ENDED_PATTERN.search(record.get("name", ""))
+            and _days_between(last_change, now) > CLOSED_ENDED_QUIET_DAYS):
+        rate *= CLOSED_ENDED_FACTOR
+
+    return 1 - math.exp(-rate * _days_between(last_checked, now))
+
+
+def build_refresh_queue(index, doc_types):
+    """Return (priority, fund_id, doc_type, detail_url) for every checkable document, most urgent first."""
+    now = datetime.now(timezone.utc)
+    queue = []
+    for fund_id, record in index.funds.items():
+        for doc_type, detail_url in record.get("detail_urls", {}).items():
+            # Documents whose fund has left the listings are not worth polling
+            if doc_type in doc_types and not record.get("documents", {}).get(doc_type, {}).get("removed_at"):
+                queue.append((change_probability(record, doc_type, now), fund_id, doc_type, detail_url))
+    queue.sort(key=lambda item: item[0], reverse=True)
+    return queue
+
+
+class Budget:
+    """Limit a run to a wall-clock duration and/or a number of network requests."""
+
+    def __init__(self, max_seconds=None, max_requests=None):
+        self.max_seconds = max_seconds
+        self.max_requests = max_requests
+        self.requests = 0
+        self._started = time.monotonic()
+
+    def spend(self, requests=1):
+        self.requests += requests
+
+    def exhausted(self):
+        """True once either limit has been reached."""
+        if self.max_requests is not None and self.requests >= self.max_requests:
+            return True
+        if self.max_seconds is not None and time.monotonic() - self._started >= self.max_seconds:
+            return True
+        return False
+
+    def remaining_seconds(self):
+        """Seconds left on the clock, or None without a time limit."""
+        if self.max_seconds is None:
+            return None
+        return max(self.max_seconds - (time.monotonic() - self._started), 0.0)
+
+    def describe(self):
+        return f"{self.requests} requests in {time.monotonic() - self._started:.0f} s"
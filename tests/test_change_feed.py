@@ -0,0 +1,79 @@
+import json
+
+from change_feed import ChangeFeed
+from fund_index import FundIndex, parse_iso
+
+
+def record(index, fund_id, sha256, url="https://x/doc.pdf"):
+    filename = index.document_filename(fund_id, "KIM")
+    index.record_document(fund_id, "KIM", filename, url=url,
+                          receipt={"filename": filename, "size": len(sha256), "sha256": sha256})
+
+
+def read_events(tmp_path):
+    with open(tmp_path / "changes.jsonl") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_downloads_report_new_and_updated_documents(tmp_path):
+    index = FundIndex(str(tmp_path))
+    feed = ChangeFeed(str(tmp_path)).attach(index)
+    index.register_fund("1", "Alpha Fund", doc_type="KIM")
+    record(index, "1", "aaa")
+    record(index, "1", "aaa")  # same bytes again: nothing to report
+    record(index, "1", "bbbb", url="https://x/doc-v2.pdf")
+    assert feed.flush() == 2
+
+    new, updated = read_events(tmp_path)
+    assert (new["event"], new["old_sha256"], new["new_sha256"]) == ("new", None, "aaa")
+    assert (updated["event"], updated["old_sha256"], updated["new_sha256"]) == ("updated", "aaa", "bbbb")
+    assert (updated["old_size"], updated["new_size"]) == (3, 4)
+    assert (tmp_path / "changes.atom").exists()
+
+
+def test_adopting_an_existing_file_is_not_a_change(tmp_path):
+    index = FundIndex(str(tmp_path))
+    ChangeFeed(str(tmp_path)).attach(index)
+    index.register_fund("1", "Alpha Fund", doc_type="KIM")
+    filename = index.document_filename("1", "KIM")
+    index.record_document("1", "KIM", filename, url="https://x/doc.pdf", downloaded_at=None)
+    assert not (tmp_path / "changes.jsonl").exists()
+
+
+def test_unlisted_documents_are_removed_once_and_relisting_is_new(tmp_path):
+    index = FundIndex(str(tmp_path))
+    ChangeFeed(str(tmp_path)).attach(index)
+    for fund_id in ("1", "2"):
+        index.register_fund(fund_id, f"Fund {fund_id}", doc_type="KIM")
+        record(index, fund_id, "sha" + fund_id)
+    for fund_id in ("1", "2"):
+        index.funds[fund_id]["listed"]["KIM"] = "2026-01-01T00:00:00Z"
+
+    crawl_started = parse_iso("2026-02-01T00:00:00Z")
+    index.funds["1"]["listed"]["KIM"] = "2026-02-02T00:00:00Z"
+    assert index.retire_unlisted(crawl_started, ["KIM"]) == 1
+    assert index.retire_unlisted(crawl_started, ["KIM"]) == 0
+    assert index.retire_unlisted(crawl_started, ["SID"]) == 0
+
+    index.register_fund("2", "Fund 2", doc_type="KIM")
+    assert "removed_at" not in index.get_document("2", "KIM")
+    events = [(event["event"], event["fund_id"]) for event in read_events(tmp_path)]
+    assert events == [("new", "1"), ("new", "2"), ("removed", "2"), ("new", "2")]
+
+
+def test_retiring_too_much_of_a_doc_type_at_once_is_refused(tmp_path):
+    index = FundIndex(str(tmp_path))
+    for fund_id in ("1", "2", "3", "4", "5"):
+        index.register_fund(fund_id, f"Fund {fund_id}", doc_type="KIM")
+        record(index, fund_id, "sha" + fund_id)
+        index.funds[fund_id]["listed"]["KIM"] = "2026-02-02T00:00:00Z"
+    crawl_started = parse_iso("2026-02-01T00:00:00Z")
+    for fund_id in ("1", "2"):
+        index.funds[fund_id]["listed"]["KIM"] = "2026-01-01T00:00:00Z"
+
+    assert index.retire_unlisted(crawl_started, ["KIM"], max_fraction=0.2) == 0
+    assert "removed_at" not in index.get_document("1", "KIM")
+
+    index.funds["2"]["listed"]["KIM"] = "2026-02-02T00:00:00Z"
+    assert index.retire_unlisted(crawl_started, ["KIM"], max_fraction=0.2) == 1
+    assert index.get_document("1", "KIM")["removed_at"]
@@ -0,0 +1,106 @@
+import os
+import json
+
+import pytest
+
+import corpus_bundle
+from corpus_bundle import ALIGNMENT, PREAMBLE, Bundle, export_bundle, _layout
+from download_receipts import hash_file
+from fund_index import FundIndex
+
+
+def add_document(index, fund_id, content, doc_type="KIM"):
+    index.register_fund(fund_id, f"Fund {fund_id}", doc_type=doc_type)
+    filename = index.document_filename(fund_id, doc_type)
+    path = os.path.join(index.download_dir, filename)
+    with open(path, "wb") as f:
+        f.write(content)
+    size, sha256, _ = hash_file(path)
+    index.record_document(fund_id, doc_type, filename, url=f"https://x/{fund_id}.pdf",
+                          receipt={"filename": filename, "size": size, "sha256": sha256})
+    return sha256
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = FundIndex(str(tmp_path / "downloads"))
+    os.makedirs(index.download_dir)
+    return index
+
+
+def test_layout_offsets_are_aligned_and_past_the_header():
+    header = {"documents": [{"fund_id": str(i)} for i in range(3)]}
+    encoded, data_start = _layout(header, [10, ALIGNMENT, 1])
+    offsets = [entry["offset"] for entry in header["documents"]]
+    assert data_start >= PREAMBLE.size + len(encoded)
+    assert offsets == [data_start, data_start + ALIGNMENT, data_start + 2 * ALIGNMENT]
+    assert all(offset % ALIGNMENT == 0 for offset in offsets)
+    # The encoded header carries the final offsets
+    assert [entry["offset"] for entry in json.loads(encoded)["documents"]] == offsets
+
+
+def test_layout_settles_when_the_header_grows_past_a_page():
+    header = {"documents": [{"fund_id": "x" * 100} for _ in range(100)]}
+    encoded, data_start = _layout(header, [1] * 100)
+    assert PREAMBLE.size + len(encoded) > ALIGNMENT
+    assert data_start == -(-(PREAMBLE.size + len(encoded)) // ALIGNMENT) * ALIGNMENT
+    assert header["documents"][0]["offset"] == data_start
+
+
+def test_full_export_round_trips_through_mmap(index, tmp_path):
+    contents = {fund_id: b"%PDF-" + fund_id.encode() * (i * 3000 + 1) for i, fund_id in enumerate("abc")}
+    for fund_id, content in contents.items():
+        add_document(index, fund_id, content)
+
+    output = str(tmp_path / "corpus.sebipack")
+    header = export_bundle(index, output)
+    assert header["base"] is None and header["removed"] == []
+    with Bundle(output) as bundle:
+        assert len(bundle) == 3
+        for fund_id, content in contents.items():
+            view = bundle.get(fund_id, "KIM")
+            assert bytes(view) == content
+            view.release()
+        assert bundle.get("missing", "KIM") is None
+
+
+def test_incremental_export_carries_only_changes_and_removals(index, tmp_path):
+    add_document(index, "a", b"%PDF a")
+    add_document(index, "b", b"%PDF b")
+    add_document(index, "c", b"%PDF c")
+    first = export_bundle(index, str(tmp_path / "full.sebipack"))
+
+    add_document(index, "b", b"%PDF b revised")
+    del index.funds["c"]
+    add_document(index, "d", b"%PDF d")
+    second = export_bundle(index, str(tmp_path / "delta.sebipack"), incremental=True)
+
+    assert second["base"] == first["bundle_id"]
+    assert [entry["fund_id"] for entry in second["documents"]] == ["b", "d"]
+    assert second["removed"] == [{"fund_id": "c", "doc_type": "KIM"}]
+    with Bundle(str(tmp_path / "delta.sebipack")) as bundle:
+        assert bundle.get("a", "KIM") is None
+        view = bundle.get("b", "KIM")
+        assert bytes(view) == b"%PDF b revised"
+        view.release()
+
+    third = export_bundle(index, str(tmp_path / "empty.sebipack"), incremental=True)
+    assert third["documents"] == [] and third["removed"] == []
+
+
+def test_export_fails_when_a_file_no_longer_matches_its_hash(index, tmp_path):
+    add_document(index, "a", b"%PDF a")
+    with open(os.path.join(index.download_dir, index.get_document("a", "KIM")["filename"]), "wb") as f:
+        f.write(b"%PDF tampered")
+    with pytest.raises(RuntimeError):
+        export_bundle(index, str(tmp_path / "corpus.sebipack"))
+    # A failed export leaves nothing behind and does not move the incremental baseline
+    assert os.listdir(tmp_path) == ["downloads"]
+    assert not os.path.exists(os.path.join(index.download_dir, corpus_bundle.EXPORT_STATE_FILENAME))
+
+
+def test_bundle_rejects_other_files(tmp_path):
+    path = tmp_path / "not-a-bundle"
+    path.write_bytes(b"PK\x03\x04" + b"\0" * 32)
+    with pytest.raises(ValueError):
+        Bundle(str(path))
@@ -0,0 +1,65 @@
+import hashlib
+
+from download_receipts import audit, hash_file, load_receipts, write_receipt
+from fund_index import FundIndex
+
+
+def add_pdf(tmp_path, index, fund_id, content, url=None):
+    index.register_fund(fund_id, f"Fund {fund_id}", doc_type="KIM")
+    filename = index.document_filename(fund_id, "KIM")
+    (tmp_path / filename).write_bytes(content)
+    receipt = {"filename": filename, "url": url or f"https://x/{fund_id}.pdf", "fund_id": fund_id,
+               "doc_type": "KIM", "size": len(content), "sha256": hashlib.sha256(content).hexdigest()}
+    index.record_document(fund_id, "KIM", filename, url=receipt["url"], receipt=receipt)
+    write_receipt(str(tmp_path), receipt)
+    return filename
+
+
+def test_hash_file_reports_size_digest_and_pdf_magic(tmp_path):
+    (tmp_path / "a.pdf").write_bytes(b"%PDF-1.7 body")
+    (tmp_path / "empty.pdf").write_bytes(b"")
+    assert hash_file(str(tmp_path / "a.pdf")) == (13, hashlib.sha256(b"%PDF-1.7 body").hexdigest(), True)
+    assert hash_file(str(tmp_path / "empty.pdf")) == (0, hashlib.sha256().hexdigest(), False)
+
+
+def test_latest_receipt_per_file_wins(tmp_path):
+    write_receipt(str(tmp_path), {"filename": "a.pdf", "size": 1})
+    write_receipt(str(tmp_path), {"filename": "a.pdf", "size": 2})
+    with open(tmp_path / "receipts.jsonl", "a") as f:
+        f.write("not json\n")
+    assert load_receipts(str(tmp_path)) == {"a.pdf": {"filename": "a.pdf", "size": 2}}
+
+
+def test_audit_classifies_every_kind_of_problem(tmp_path):
+    index = FundIndex(str(tmp_path))
+    ok = add_pdf(tmp_path, index, "ok", b"%PDF ok")
+    missing = add_pdf(tmp_path, index, "missing", b"%PDF missing")
+    (tmp_path / missing).unlink()
+    resized = add_pdf(tmp_path, index, "resized", b"%PDF resized")
+    (tmp_path / resized).write_bytes(b"%PDF resized, and then some")
+    tampered = add_pdf(tmp_path, index, "tampered", b"%PDF tampered")
+    (tmp_path / tampered).write_bytes(b"%PDF TAMPERED")
+    not_pdf = add_pdf(tmp_path, index, "html", b"<html>error</html>")
+    stale = add_pdf(tmp_path, index, "stale", b"%PDF stale")
+    index.funds["stale"]["documents"]["KIM"]["url"] = "https://x/stale-v2.pdf"
+
+    index.register_fund("adopted", "Fund adopted", doc_type="KIM")
+    unverified = index.document_filename("adopted", "KIM")
+    (tmp_path / unverified).write_bytes(b"%PDF from before receipts")
+    index.record_document("adopted", "KIM", unverified, url=None, downloaded_at=None)
+    (tmp_path / "stray.pdf").write_bytes(b"%PDF stray")
+
+    report = audit(str(tmp_path), index=index, workers=1)
+    assert report["missing"] == [missing]
+    assert report["corrupt"] == sorted([resized, tampered, not_pdf])
+    assert report["orphaned"] == ["stray.pdf"]
+    assert report["stale"] == [stale]
+    assert report["unverified"] == [unverified]
+    assert report["ok"] == 2  # the stale file itself is intact
+    assert ok not in sum((report[key] for key in ("missing", "corrupt", "orphaned", "stale", "unverified")), [])
+
+
+def test_audit_without_an_index_calls_unreceipted_files_orphaned(tmp_path):
+    (tmp_path / "a.pdf").write_bytes(b"%PDF a")
+    report = audit(str(tmp_path), workers=1)
+    assert report["orphaned"] == ["a.pdf"] and report["ok"] == 0
@@ -0,0 +1,98 @@
+from fund_index import FundIndex, fund_id_for, parse_js_args
+
+
+def test_parse_js_args_keeps_parentheses_and_commas_inside_quotes():
+    assert parse_js_args("getfundDetails('12','Fund, A (Growth)')") == ["12", "Fund, A (Growth)"]
+    assert parse_js_args('javascript:getfundDetails(12, "Peerless (formerly X) Fund")') == [
+        "12", "Peerless (formerly X) Fund"
+    ]
+
+
+def test_parse_js_args_unescapes_and_stops_at_the_first_call():
+    assert parse_js_args(r"f('it\'s', 3); g('other')") == ["it's", "3"]
+
+
+def test_parse_js_args_rejects_malformed_calls():
+    assert parse_js_args("getmutuakFund()") == []
+    assert parse_js_args("f('unterminated") == []
+    assert parse_js_args("no call here") == []
+    assert parse_js_args(None) == []
+
+
+def test_fund_id_is_built_only_from_parsed_tokens():
+    fund_id = fund_id_for(onclick="getfundDetails('12','7','Fund, A (Growth)')", fund_name="Fund, A (Growth)")
+    assert fund_id == "12-7"
+    assert "'" not in fund_id and '"' not in fund_id
+
+
+def test_fund_id_survives_a_rename(tmp_path):
+    old_id = fund_id_for(onclick="getfundDetails('12','Peerless Equity Fund')", fund_name="Peerless Equity Fund")
+    new_id = fund_id_for(href="javascript:getfundDetails('12','Mahindra Equity Fund')",
+                         fund_name="Mahindra  Equity Fund")
+    assert old_id == new_id == "12"
+
+    index = FundIndex(str(tmp_path))
+    index.register_fund(old_id, "Peerless Equity Fund", doc_type="KIM")
+    filename = index.document_filename(old_id, "KIM")
+    index.record_document(old_id, "KIM", filename, url="https://x/12.pdf")
+    index.register_fund(new_id, "Mahindra Equity Fund", doc_type="KIM")
+    assert list(index.funds) == ["12"]
+    assert index.has_document(new_id, "KIM")
+    assert index.document_filename(new_id, "KIM") == filename
+
+
+def test_fund_id_falls_back_to_pdf_then_name():
+    assert fund_id_for(onclick="f('broken", pdf_url="https://x/docs/abc123.pdf?v=1") == "pdf:abc123"
+    assert fund_id_for(fund_name="Some Fund - Growth") == "name:some fund growth"
+
+
+def test_same_display_name_gets_distinct_filenames(tmp_path):
+    index = FundIndex(str(tmp_path))
+    index.register_fund("1", "Alpha Fund", doc_type="KIM")
+    index.register_fund("2", "Alpha Fund", doc_type="KIM")
+    first = index.document_filename("1", "KIM")
+    second = index.document_filename("2", "KIM")
+    assert first != second
+    assert second.endswith("_2_KIM.pdf")
+    # Assignments are stable
+    assert index.document_filename("1", "KIM") == first
+    assert index.lookup_name("alpha  fund") == ["1", "2"]
+
+
+def test_untracked_file_is_adopted_by_its_fund(tmp_path):
+    index = FundIndex(str(tmp_path))
+    index.register_fund("1", "Alpha Fund", doc_type="KIM")
+    filename = index.document_filename("1", "KIM")
+    index.save()
+    (tmp_path / filename).write_bytes(b"%PDF old")
+
+    index = FundIndex(str(tmp_path))
+    assert not index.has_document("1", "KIM")
+    assert index.document_filename("1", "KIM") == filename
+    assert index.has_document("1", "KIM")
+    assert index.get_document("1", "KIM")["downloaded_at"] is None
+
+
+def test_rename_keeps_the_old_name_as_an_alias(tmp_path):
+    index = FundIndex(str(tmp_path))
+    index.register_fund("1", "Peerless Equity Fund")
+    index.register_fund("1", "Mahindra Equity Fund")
+    assert index.funds["1"]["name"] == "Mahindra Equity Fund"
+    assert index.lookup_name("Peerless Equity Fund") == ["1"]
+    assert index.lookup_name("Mahindra Equity Fund") == ["1"]
+
+
+def test_index_survives_a_reload(tmp_path):
+    index = FundIndex(str(tmp_path))
+    index.register_fund("1", "Alpha Fund", doc_type="KIM", detail_url="https://x/1")
+    filename = index.document_filename("1", "KIM")
+    index.record_document("1", "KIM", filename, url="https://x/1.pdf",
+                          receipt={"filename": filename, "size": 3, "sha256": "abc"})
+    index.save()
+
+    reloaded = FundIndex(str(tmp_path))
+    assert reloaded.get_document("1", "KIM")["sha256"] == "abc"
+    assert reloaded.funds["1"]["detail_urls"] == {"KIM": "https://x/1"}
+    # The claimed filename is not offered to another fund
+    reloaded.register_fund("2", "Alpha Fund", doc_type="KIM")
+    assert reloaded.document_filename("2", "KIM") != filename
@@ -0,0 +1,67 @@
+import os
+import time
+
+import pytest
+
+import http_cache
+from http_cache import HttpCache
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def test_put_then_get_round_trips(cache_dir):
+    cache = HttpCache(cache_dir)
+    cache.put("GET", "https://x/a", "<html>á</html>")
+    assert cache.get("GET", "https://x/a") == "<html>á</html>"
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_form_data_is_part_of_the_key(cache_dir):
+    cache = HttpCache(cache_dir)
+    cache.put("POST", "https://x/a", "one", data={"b": "2", "a": "1"})
+    assert cache.get("POST", "https://x/a", data={"a": "1", "b": "2"}) == "one"
+    assert cache.get("POST", "https://x/a", data={"a": "9"}) is None
+    assert cache.get("GET", "https://x/a") is None
+
+
+def test_entries_expire_after_the_ttl_except_offline(cache_dir, monkeypatch):
+    cache = HttpCache(cache_dir, ttl_seconds=60)
+    cache.put("GET", "https://x/a", "page")
+    later = time.time() + 61
+    monkeypatch.setattr(http_cache.time, "time", lambda: later)
+    assert cache.get("GET", "https://x/a") is None
+    assert HttpCache(cache_dir, ttl_seconds=60, offline=True).get("GET", "https://x/a") == "page"
+
+
+def test_least_recently_used_entries_are_evicted(cache_dir):
+    body = os.urandom(4000).hex()  # incompressible, roughly 4 KB gzipped
+    cache = HttpCache(cache_dir, max_bytes=0)  # unlimited while filling
+    for name in ("a", "b", "c"):
+        cache.put("GET", f"https://x/{name}", body)
+    entry_size = cache._total_bytes / 3
+
+    # Make "a" the most recently used, then squeeze the cache to two entries
+    now = time.time()
+    for age, name in ((30, "b"), (20, "c"), (10, "a")):
+        path = cache._path(http_cache.cache_key("GET", f"https://x/{name}"))
+        os.utime(path, (now - age, now - age))
+    cache.max_bytes = int(entry_size * 3.2)
+    cache.put("GET", "https://x/d", body)
+
+    assert cache.get("GET", "https://x/b") is None
+    assert cache.get("GET", "https://x/c") is None
+    assert cache.get("GET", "https://x/a") == body
+    assert cache.get("GET", "https://x/d") == body
+    assert cache._total_bytes <= cache.max_bytes
+
+
+def test_size_is_tracked_across_instances(cache_dir):
+    cache = HttpCache(cache_dir)
+    cache.put("GET", "https://x/a", "page")
+    cache.put("GET", "https://x/a", "page again")
+    assert HttpCache(cache_dir)._total_bytes == cache._total_bytes
+    cache.clear()
+    assert HttpCache(cache_dir)._total_bytes == 0
@@ -0,0 +1,77 @@
+import hashlib
+import threading
+
+import pdf_download
+from download_receipts import load_receipts
+from pdf_download import DownloadPool, find_pdf_url
+
+
+def fake_download(calls, release=None):
+    def download_pdf(url, filename, download_dir, fund_id=None, doc_type=None):
+        calls.append((url, filename))
+        if release is not None:
+            release.wait(5)
+        content = b"%PDF " + url.encode()
+        with open(f"{download_dir}/{filename}", "wb") as f:
+            f.write(content)
+        return {"filename": filename, "url": url, "fund_id": fund_id, "doc_type": doc_type,
+                "size": len(content), "sha256": hashlib.sha256(content).hexdigest()}
+    return download_pdf
+
+
+def test_find_pdf_url_reads_the_viewer_iframe():
+    html = '<iframe class="x" src="/web/?file=https://x/docs/kim.pdf&zoom=1"></iframe>'
+    assert find_pdf_url(html) == "https://x/docs/kim.pdf"
+    assert find_pdf_url("<p>no viewer</p>") is None
+
+
+def test_overlapping_downloads_of_one_url_fetch_once_and_give_each_fund_a_file(tmp_path, monkeypatch):
+    calls, release = [], threading.Event()
+    monkeypatch.setattr(pdf_download, "download_pdf", fake_download(calls, release))
+    recorded = []
+
+    pool = DownloadPool(max_workers=2)
+    first = pool.submit("https://x/a.pdf", "A_KIM.pdf", str(tmp_path), fund_id="a", doc_type="KIM",
+                        on_success=recorded.append)
+    again = pool.submit("https://x/a.pdf", "A_KIM.pdf", str(tmp_path), fund_id="a", doc_type="KIM")
+    other = pool.submit("https://x/a.pdf", "B_KIM.pdf", str(tmp_path), fund_id="b", doc_type="KIM",
+                        on_success=recorded.append)
+    release.set()
+    pool.close()
+
+    assert calls == [("https://x/a.pdf", "A_KIM.pdf")]
+    assert again is first
+    assert other.result()["filename"] == "B_KIM.pdf" and other.result()["fund_id"] == "b"
+    assert (tmp_path / "B_KIM.pdf").read_bytes() == (tmp_path / "A_KIM.pdf").read_bytes()
+    assert sorted(receipt["filename"] for receipt in recorded) == ["A_KIM.pdf", "B_KIM.pdf"]
+    assert set(load_receipts(str(tmp_path))) == {"B_KIM.pdf"}  # the fake download writes no receipt
+    assert (pool.stats["submitted"], pool.stats["deduplicated"], pool.stats["downloaded"]) == (1, 2, 1)
+
+
+def test_a_url_is_fetched_again_once_its_download_has_finished(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(pdf_download, "download_pdf", fake_download(calls))
+    pool = DownloadPool(max_workers=0)
+    pool.submit("https://x/a.pdf", "A_KIM.pdf", str(tmp_path))
+    pool.submit("https://x/a.pdf", "A_KIM.pdf", str(tmp_path))
+    pool.close()
+    assert len(calls) == 2 and pool.stats["deduplicated"] == 0
+
+
+def test_close_with_a_timeout_cancels_downloads_that_have_not_started(tmp_path, monkeypatch):
+    calls, release = [], threading.Event()
+    monkeypatch.setattr(pdf_download, "download_pdf", fake_download(calls, release))
+    pool = DownloadPool(max_workers=1)
+    running = pool.submit("https://x/a.pdf", "A_KIM.pdf", str(tmp_path))
+    queued = pool.submit("https://x/b.pdf", "B_KIM.pdf", str(tmp_path))
+
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    pool.close(timeout=0.05)
+    timer.join()
+
+    assert running.result()["filename"] == "A_KIM.pdf"
+    assert queued.result() is False
+    assert calls == [("https://x/a.pdf", "A_KIM.pdf")]
+    assert (pool.stats["downloaded"], pool.stats["cancelled"]) == (1, 1)
+    assert not (tmp_path / "B_KIM.pdf").exists()
@@ -0,0 +1,71 @@
+import gzip
+
+import pytest
+import requests
+
+from record_replay import ReplayAdapter, WarcArchive, WarcWriter, builtin_name, request_key
+
+
+def prepared(method, url, data=None):
+    return requests.Request(method, url, data=data).prepare()
+
+
+def replay_session(archive):
+    session = requests.Session()
+    session.mount("https://", ReplayAdapter(archive))
+    return session
+
+
+def test_recorded_responses_replay_byte_for_byte(tmp_path):
+    path = str(tmp_path / "run.warc.gz")
+    writer = WarcWriter(path)
+    page = "<html>Fund ₹ details</html>".encode("utf-8")
+    pdf = b"%PDF-1.7\r\n\r\n\x00\xff binary"
+    writer.write_response(request_key(prepared("GET", "https://x/fund?id=1")), "GET", "https://x/fund?id=1",
+                          200, "OK", {"Content-Type": "text/html; charset=utf-8"}, page)
+    writer.write_response(request_key(prepared("POST", "https://x/list", {"type": "KIM"})), "POST",
+                          "https://x/list", 200, "OK", {"Content-Type": "text/html"}, b"<table></table>")
+    writer.write_response(request_key(prepared("GET", "https://x/a.pdf")), "GET", "https://x/a.pdf",
+                          404, "Not Found", {"Content-Type": "application/pdf"}, pdf)
+
+    # One gzip member per record, so the archive is still a valid .warc.gz
+    with gzip.open(path, "rb") as f:
+        assert f.read().count(b"WARC/1.0\r\n") == 3
+
+    archive = WarcArchive(path)
+    assert len(archive) == 3
+    status, reason, headers, body = archive.get(request_key(prepared("GET", "https://x/a.pdf")))
+    assert (status, reason, headers["content-type"], body) == (404, "Not Found", "application/pdf", pdf)
+
+    session = replay_session(archive)
+    response = session.get("https://x/fund?id=1")
+    assert response.status_code == 200
+    assert response.text == "<html>Fund ₹ details</html>"
+    assert session.post("https://x/list", data={"type": "KIM"}).text == "<table></table>"
+    with pytest.raises(requests.HTTPError):
+        session.get("https://x/a.pdf").raise_for_status()
+    archive.close()
+
+
+def test_replay_of_an_unrecorded_request_fails_like_a_dead_network(tmp_path):
+    path = str(tmp_path / "run.warc.gz")
+    WarcWriter(path).write_response(request_key(prepared("POST", "https://x/list", {"type": "KIM"})), "POST",
+                                    "https://x/list", 200, "OK", {}, b"kim")
+    archive = WarcArchive(path)
+    session = replay_session(archive)
+    with pytest.raises(requests.ConnectionError):
+        session.post("https://x/list", data={"type": "SID"})
+    with pytest.raises(requests.ConnectionError):
+        session.get("https://x/list")
+    archive.close()
+
+
+def test_builtin_name_extracts_the_bare_name():
+    assert builtin_name("<method 'read' of '_io.BufferedReader' objects>") == "read"
+    assert builtin_name("<built-in method time.sleep>") == "sleep"
+    assert builtin_name("<built-in method _socket.getaddrinfo>") == "getaddrinfo"
+    assert builtin_name("<built-in function open>") == "open"
+    # Names that merely contain an I/O word are not mistaken for it
+    assert builtin_name("<method 'readable' of '_io.BufferedReader' objects>") == "readable"
+    assert builtin_name("<built-in method builtins.isinstance>") == "isinstance"
+    assert builtin_name("something else") == "something else"
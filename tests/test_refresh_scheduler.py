@@ -0,0 +1,71 @@
+import refresh_scheduler
+from fund_index import FundIndex, parse_iso
+from refresh_scheduler import Budget, build_refresh_queue, change_probability
+
+NOW = parse_iso("2026-06-01T00:00:00Z")
+
+
+def fund(name="Alpha Fund", changes=(), last_checked="2026-05-01T00:00:00Z", url="https://x/a.pdf"):
+    return {
+        "name": name,
+        "first_seen": "2025-06-01T00:00:00Z",
+        "last_checked": {"KIM": last_checked},
+        "documents": {"KIM": {"url": url, "changes": list(changes)}},
+    }
+
+
+def test_documents_never_fetched_go_first():
+    assert change_probability({"name": "New Fund", "documents": {}}, "KIM", NOW) == 1.0
+    assert change_probability(fund(url=None), "KIM", NOW) == 1.0
+
+
+def test_probability_grows_with_time_since_the_check_and_with_past_revisions():
+    just_checked = change_probability(fund(last_checked="2026-06-01T00:00:00Z"), "KIM", NOW)
+    month_ago = change_probability(fund(), "KIM", NOW)
+    busy = change_probability(fund(changes=["2025-09-01T00:00:00Z", "2026-01-01T00:00:00Z",
+                                            "2026-04-01T00:00:00Z"]), "KIM", NOW)
+    assert just_checked == 0.0
+    assert 0.0 < month_ago < busy < 1.0
+
+
+def test_quiet_closed_ended_schemes_are_discounted():
+    open_ended = change_probability(fund(name="Alpha Equity Fund"), "KIM", NOW)
+    fmp = change_probability(fund(name="Alpha Fixed Maturity Plan Series 12"), "KIM", NOW)
+    assert fmp < open_ended * 0.1
+
+
+def test_refresh_queue_is_most_urgent_first_and_skips_removed_documents(tmp_path):
+    index = FundIndex(str(tmp_path))
+    for fund_id in ("old", "new", "gone"):
+        index.register_fund(fund_id, f"Fund {fund_id}", doc_type="KIM", detail_url=f"https://x/{fund_id}")
+    index.register_fund("old", "Fund old", doc_type="SID", detail_url="https://x/old-sid")
+    for fund_id in ("old", "gone"):
+        index.funds[fund_id]["documents"]["KIM"] = {"url": f"https://x/{fund_id}.pdf", "changes": []}
+        index.funds[fund_id]["last_checked"] = {"KIM": "2026-01-01T00:00:00Z"}
+    index.funds["gone"]["documents"]["KIM"]["removed_at"] = "2026-02-01T00:00:00Z"
+
+    queue = build_refresh_queue(index, ["KIM"])
+    assert [(fund_id, doc_type) for _, fund_id, doc_type, _ in queue] == [("new", "KIM"), ("old", "KIM")]
+    assert queue[0][0] == 1.0 and queue[1][0] < 1.0
+    assert queue[1][3] == "https://x/old"
+
+
+def test_budget_stops_at_either_limit(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(refresh_scheduler.time, "monotonic", lambda: clock[0])
+
+    requests = Budget(max_requests=2)
+    requests.spend()
+    assert not requests.exhausted()
+    requests.spend()
+    assert requests.exhausted()
+    assert requests.remaining_seconds() is None
+
+    minutes = Budget(max_seconds=60)
+    clock[0] += 45
+    assert not minutes.exhausted()
+    assert minutes.remaining_seconds() == 15
+    clock[0] += 20
+    assert minutes.exhausted()
+    assert minutes.remaining_seconds() == 0
+    assert minutes.describe() == "0 requests in 65 s"
@@ -0,0 +1,129 @@
+import pytest
+
+import work_queue
+from work_queue import WorkQueue
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return WorkQueue(str(tmp_path / "queue.db"), max_attempts=2)
+
+
+def test_publish_is_idempotent_while_tasks_are_open(queue):
+    assert queue.publish([("a", {"n": 1}, 0.5), ("b", {"n": 2}, 0.9)]) == 2
+    assert queue.publish([("a", {"n": 1}, 0.5)]) == 0
+    assert queue.counts() == {"pending": 2}
+
+
+def test_lease_takes_the_most_urgent_task_once(queue):
+    queue.publish([("low", {}, 0.1), ("high", {}, 0.9)])
+    first = queue.lease("w1")
+    second = queue.lease("w2")
+    assert (first.id, second.id) == ("high", "low")
+    assert first.attempts == 1
+    assert queue.lease("w3") is None
+
+
+def test_expired_lease_goes_to_the_next_worker(queue, clock):
+    queue.publish([("a", {}, 0)])
+    task = queue.lease("w1", visibility_timeout=10)
+    clock.now += 5
+    assert queue.heartbeat(task.id, "w1", visibility_timeout=10)
+    clock.now += 11
+
+    retaken = queue.lease("w2", visibility_timeout=10)
+    assert retaken.id == "a" and retaken.attempts == 2
+    # The first worker has lost the task and can no longer touch it
+    assert not queue.heartbeat(task.id, "w1", visibility_timeout=10)
+    queue.fail(task.id, "w1", "late")
+    assert queue.counts() == {"leased": 1}
+
+
+def test_only_the_current_lease_holder_can_complete(queue, clock):
+    queue.publish([("a", {}, 0)])
+    task = queue.lease("w1", visibility_timeout=10)
+    clock.now += 11
+    queue.lease("w2", visibility_timeout=10)
+    assert not queue.complete(task.id, "w1", {"from": "w1"})
+    assert queue.complete(task.id, "w2", {"from": "w2"})
+    assert queue.collect_results() == [("a", {"from": "w2"})]
+
+
+def test_failed_tasks_are_retried_until_out_of_attempts(queue):
+    queue.publish([("a", {}, 0)])
+    queue.fail(queue.lease("w1").id, "w1", "boom")
+    assert queue.counts() == {"pending": 1}
+    queue.fail(queue.lease("w1").id, "w1", "boom again")
+    assert queue.counts() == {"failed": 1}
+    assert queue.lease("w1") is None
+
+
+def test_lease_expiring_on_the_last_attempt_marks_the_task_failed(queue, clock):
+    queue.publish([("a", {}, 0)])
+    queue.lease("w1", visibility_timeout=10)
+    clock.now += 11
+    queue.lease("w2", visibility_timeout=10)
+    clock.now += 11
+    assert queue.lease("w3") is None
+    assert queue.counts() == {"failed": 1}
+
+
+def test_complete_is_idempotent_and_results_are_collected_once(queue):
+    queue.publish([("a", {}, 0)])
+    task = queue.lease("w1")
+    assert queue.complete(task.id, "w1", {"ok": True})
+    assert not queue.complete(task.id, "w2", {"ok": False})
+    assert queue.collect_results() == [("a", {"ok": True})]
+    assert queue.collect_results() == []
+
+
+def test_collected_tasks_can_be_published_again(queue):
+    queue.publish([("a", {"v": 1}, 0)])
+    queue.complete(queue.lease("w1").id, "w1", {})
+    assert queue.publish([("a", {"v": 2}, 0)]) == 0  # result not collected yet
+    queue.collect_results()
+    assert queue.publish([("a", {"v": 2}, 0)]) == 1
+    task = queue.lease("w1")
+    assert task.payload == {"v": 2} and task.attempts == 1
+
+
+def test_rate_slots_are_spaced_across_callers(queue, clock, monkeypatch):
+    slept = []
+
+    def fake_sleep(seconds):
+        slept.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(work_queue.time, "sleep", fake_sleep)
+    queue.acquire_rate_slot("example.com", 2.0)
+    queue.acquire_rate_slot("example.com", 2.0)
+    queue.acquire_rate_slot("other.com", 2.0)
+    assert slept == [2.0]
+
+
+def test_skipped_offline_results_leave_the_document_due(queue, tmp_path):
+    from distributed_crawl import merge_results
+    from fund_index import FundIndex
+
+    index = FundIndex(str(tmp_path))
+    index.register_fund("1", "Alpha Fund", doc_type="KIM")
+    queue.publish([("KIM:1", {}, 0), ("SID:1", {}, 0)])
+    queue.complete(queue.lease("w1").id, "w1", {"fund_id": "1", "doc_type": "KIM", "skipped": True})
+    queue.complete(queue.lease("w1").id, "w1", {"fund_id": "1", "doc_type": "SID", "pdf_url": None})
+    assert merge_results(index, queue) == 2
+    assert list(index.funds["1"]["last_checked"]) == ["SID"]
@@ -0,0 +1,234 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VISIBILITY_TIMEOUT = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    priority REAL NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    result TEXT,
+    error TEXT,
+    collected INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_by_state ON tasks (state, priority);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    host TEXT PRIMARY KEY,
+    next_at REAL NOT NULL
+);
+"""
+
+
+class Task:
+    """A leased task: its id, decoded payload and how many times it has been leased."""
+
+    def __init__(self, task_id, payload, attempts):
+        self.id = task_id
+        self.payload = payload
+        self.attempts = attempts
+
+
+class WorkQueue:
+    """Task queue in a SQLite file that many processes, or machines on a shared volume, can use.
+
+    Workers lease a task for ``visibility_timeout`` seconds and keep the lease
+    alive with heartbeats; a task whose lease runs out goes back to whoever
+    asks next. Completing a task is idempotent. The database also holds a
+    per-host request schedule so every worker together respects one rate limit.
+
+    Every state change runs in a ``BEGIN IMMEDIATE`` transaction, and the
+    default rollback journal is used rather than WAL because WAL does not work
+    across network filesystems.
+    """
+
+    def __init__(self, path, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _ImmediateTransaction(self._connection())
+
+    def publish(self, tasks):
+        """Add or re-arm tasks given as (task_id, payload, priority).
+
+        Tasks already pending or leased are left alone, so publishing twice is
+        harmless. Finished tasks whose results have been collected, and failed
+        ones, are queued again with the new payload.
+        """
+        now = time.time()
+        published = 0
+        with self._transaction() as conn:
+            for task_id, payload, priority in tasks:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO tasks (id, payload, priority, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        payload = excluded.payload, priority = excluded.priority, state = 'pending',
+                        attempts = 0, worker = NULL, lease_until = NULL, result = NULL, error = NULL,
+                        collected = 0, updated_at = excluded.updated_at
+                    WHERE (tasks.state = 'done' AND tasks.collected = 1) OR tasks.state = 'failed'
+                    """,
+                    (task_id, json.dumps(payload), priority, now),
+                )
+                published += cursor.rowcount
+        return published
+
+    def lease(self, worker, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+        """Lease the most urgent available task for this worker, or return None."""
+        now = time.time()
+        with self._transaction() as conn:
+            # Tasks that keep losing their lease are given up on
+            conn.execute(
+                "UPDATE tasks SET state = 'failed', updated_at = ? "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM tasks "
+                "WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY priority DESC LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (worker, now + visibility_timeout, now, row[0]),
+            )
+        return Task(row[0], json.loads(row[1]), row[2] + 1)
+
+    def heartbeat(self, task_id, worker, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+        """Extend a lease; returns False if the worker no longer holds it."""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                (now + visibility_timeout, now, task_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, task_id, worker, result):
+        """Mark a task done with its result; returns False if the worker no longer holds its lease."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET state = 'done', lease_until = NULL, result = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = 'leased'",
+                (json.dumps(result), time.time(), task_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, task_id, worker, error):
+        """Give a task back after an error; it is retried until it runs out of attempts."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "lease_until = NULL, error = ?, updated_at = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                (self.max_attempts, error, time.time(), task_id, worker),
+            )
+
+    def collect_results(self):
+        """Return [(task_id, result)] for finished tasks not collected before, marking them collected."""
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT id, result FROM tasks WHERE state = 'done' AND collected = 0").fetchall()
+            conn.executemany("UPDATE tasks SET collected = 1 WHERE id = ?", [(row[0],) for row in rows])
+        return [(task_id, json.loads(result)) for task_id, result in rows]
+
+    def counts(self):
+        """Number of tasks in each state."""
+        rows = self._connection().execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall()
+        return dict(rows)
+
+    def acquire_rate_slot(self, host, min_interval):
+        """Block until this process may send a request to host, then claim that slot.
+
+        Slots are spaced ``min_interval`` seconds apart across every worker
+        sharing the queue. Nodes should keep their clocks in sync (NTP).
+        """
+        if not min_interval:
+            return
+        while True:
+            now = time.time()
+            with self._transaction() as conn:
+                row = conn.execute("SELECT next_at FROM rate_limits WHERE host = ?", (host,)).fetchone()
+                next_at = row[0] if row else 0
+                if now >= next_at:
+                    conn.execute(
+                        "INSERT INTO rate_limits (host, next_at) VALUES (?, ?) "
+                        "ON CONFLICT(host) DO UPDATE SET next_at = excluded.next_at",
+                        (host, now + min_interval),
+                    )
+                    return
+            time.sleep(min(next_at - now, min_interval))
+
+
+class _ImmediateTransaction:
+    """Context manager running a block inside BEGIN IMMEDIATE ... COMMIT."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+
+class Heartbeat:
+    """Keep a task's lease alive from a background thread while it is being worked on."""
+
+    def __init__(self, queue, task, worker, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+        self.queue = queue
+        self.task = task
+        self.worker = worker
+        self.visibility_timeout = visibility_timeout
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.visibility_timeout / 3):
+            try:
+                if not self.queue.heartbeat(self.task.id, self.worker, self.visibility_timeout):
+                    logger.warning(f"Lost lease on task {self.task.id}")
+                    self.lost = True
+                    return
+            except sqlite3.Error as e:
+                logger.warning(f"Heartbeat for task {self.task.id} failed: {str(e)}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False